@@ -0,0 +1,201 @@
+"""
+Admission control for the analysis endpoints.
+
+Every admitted request holds its upload (up to MAX_UPLOAD_BYTES) and later
+a decoded image in memory, so the number of requests in the service is
+bounded: at most ADMISSION_CONCURRENCY analyses run at once and at most
+ADMISSION_QUEUE more requests wait for a slot. AdmissionMiddleware answers
+anything beyond that with 503 and Retry-After before reading the body, and
+a request that waited ADMISSION_QUEUE_TIMEOUT seconds for a slot gets 503
+as well, so a spike is shed in milliseconds instead of growing memory
+until the container is killed. A request holding several images (a batch)
+takes one admission per image with admit_more() once it knows how many it
+has, before reading them. Queue depth and wait times are in stats().
+
+Environment:
+    ADMISSION_CONCURRENCY    analyses running at once (default: ANALYSIS_WORKERS, at least 1)
+    ADMISSION_QUEUE          requests waiting for a slot before 503 (default 16)
+    ADMISSION_QUEUE_TIMEOUT  seconds a request may wait for a slot (default 10)
+"""
+import asyncio
+import math
+import os
+import time
+from collections import deque
+
+import numpy as np
+from starlette.responses import JSONResponse
+
+import analysis_pool
+
+ADMISSION_CONCURRENCY = int(os.environ.get('ADMISSION_CONCURRENCY', max(1, analysis_pool.ANALYSIS_WORKERS)))
+ADMISSION_QUEUE = int(os.environ.get('ADMISSION_QUEUE', 16))
+ADMISSION_QUEUE_TIMEOUT = float(os.environ.get('ADMISSION_QUEUE_TIMEOUT', 10))
+
+# waits kept for the percentiles
+WAIT_WINDOW = 1000
+# weight of the latest analysis in the service time estimate used for Retry-After
+SERVICE_TIME_ALPHA = 0.2
+
+OVERLOADED = "Server is busy, please retry later"
+
+
+class Overloaded(Exception):
+    def __init__(self, retry_after):
+        super().__init__(OVERLOADED)
+        self.retry_after = retry_after
+
+
+class AdmissionControl:
+    """
+    Bounds the requests in the service (admit) and the analyses running at
+    once (slot). Only used from the event loop, so plain counters suffice.
+    """
+
+    def __init__(self, concurrency=ADMISSION_CONCURRENCY, queue=ADMISSION_QUEUE,
+                 queue_timeout=ADMISSION_QUEUE_TIMEOUT):
+        self.concurrency = concurrency
+        self.queue = queue
+        self.queue_timeout = queue_timeout
+        # admissions in the service at most (running + waiting)
+        self.capacity = concurrency + queue
+        self.in_flight = 0
+        self.running = 0
+        self.waiting = 0
+        self._semaphore = None
+        self._waits = deque(maxlen=WAIT_WINDOW)
+        self._service_time = None
+        self._stats = {'admitted': 0, 'rejected': 0, 'queue_timeouts': 0}
+
+    def retry_after(self):
+        """Seconds until the queue ahead has likely drained (at least 1)"""
+        service_time = self._service_time or 1.0
+        return max(1, math.ceil((self.waiting + 1) * service_time / self.concurrency))
+
+    def admit(self, count=1):
+        """
+        Count a request in the service as count admissions (one per image),
+        raises Overloaded when fewer slots and queue places are free.
+        Call release(count) when the request is done.
+        """
+        if self.in_flight + count > self.capacity:
+            self._stats['rejected'] += 1
+            raise Overloaded(self.retry_after())
+        self.in_flight += count
+        self._stats['admitted'] += count
+
+    def release(self, count=1):
+        self.in_flight -= count
+
+    def admit_more(self, request, count):
+        """
+        Take count more admissions for a request AdmissionMiddleware admitted
+        (the other images of a batch), released together with the request.
+        Raises Overloaded when they are not free.
+        """
+        if count > 0:
+            self.admit(count)
+            request.state.admissions += count
+
+    def slot(self, bounded=True):
+        """
+        async context manager around one analysis, waits for a free slot
+        bounded: False waits without the queue timeout (background jobs)
+        """
+        return _Slot(self, bounded)
+
+    async def _acquire(self, bounded=True):
+        if self._semaphore is None:
+            # created on first use so it belongs to the running event loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout if bounded else None)
+        except asyncio.TimeoutError:
+            self._stats['queue_timeouts'] += 1
+            raise Overloaded(self.retry_after())
+        finally:
+            self.waiting -= 1
+            self._waits.append(time.perf_counter() - start)
+        self.running += 1
+
+    def _release(self, service_time):
+        self.running -= 1
+        self._semaphore.release()
+        if self._service_time is None:
+            self._service_time = service_time
+        else:
+            self._service_time += SERVICE_TIME_ALPHA * (service_time - self._service_time)
+
+    def stats(self):
+        waits = np.array(self._waits)
+        return dict(
+            self._stats,
+            in_flight=self.in_flight,
+            running=self.running,
+            queue_depth=self.waiting,
+            concurrency=self.concurrency,
+            max_queue=self.queue,
+            queue_timeout_s=self.queue_timeout,
+            wait_ms={
+                'mean': round(float(waits.mean()) * 1000, 2),
+                'p50': round(float(np.percentile(waits, 50)) * 1000, 2),
+                'p95': round(float(np.percentile(waits, 95)) * 1000, 2),
+                'max': round(float(waits.max()) * 1000, 2),
+            } if len(waits) else None,
+            service_time_s=round(self._service_time, 4) if self._service_time else None,
+            retry_after_s=self.retry_after()
+        )
+
+
+class _Slot:
+    def __init__(self, control, bounded):
+        self.control = control
+        self.bounded = bounded
+        self.start = None
+
+    async def __aenter__(self):
+        await self.control._acquire(self.bounded)
+        self.start = time.perf_counter()
+
+    async def __aexit__(self, *exc):
+        self.control._release(time.perf_counter() - self.start)
+
+
+def overloaded_response(retry_after):
+    return JSONResponse({'detail': OVERLOADED}, status_code=503,
+                        headers={'Retry-After': str(retry_after), 'Connection': 'close'})
+
+
+class AdmissionMiddleware:
+    """
+    ASGI middleware admitting POST requests to the given paths, 503 with
+    Retry-After (without reading the body) when the service is full.
+    on_reject: called with (path, 503) for every rejected request
+    """
+
+    def __init__(self, app, control, paths, on_reject=None):
+        self.app = app
+        self.control = control
+        self.paths = set(paths)
+        self.on_reject = on_reject
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'POST' or scope['path'] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+        try:
+            self.control.admit()
+        except Overloaded as e:
+            if self.on_reject is not None:
+                self.on_reject(scope['path'], 503)
+            await overloaded_response(e.retry_after)(scope, receive, send)
+            return
+        # request.state.admissions, raised by admit_more()
+        state = scope.setdefault('state', {})
+        state['admissions'] = 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.control.release(state['admissions'])
@@ -0,0 +1,214 @@
+"""
+Process pool for the CPU-bound analysis (dlib, k-means, MediaPipe).
+
+The API handlers await AnalysisPool.run() so a slow image never blocks the
+event loop. Every worker process loads its models once in the initializer.
+Python 3.9 has no max_tasks_per_child, so the pool recycles itself: after
+ANALYSIS_MAX_TASKS_PER_WORKER tasks per worker, after a timeout or after a
+crashed worker, new tasks go to a fresh executor, whose workers are started
+(and load their models) right away, and the old one exits once its running
+tasks are done. A worker stuck past its timeout is terminated
+(then killed) once every other task of its executor has had the same time
+to finish.
+
+Environment:
+    ANALYSIS_WORKERS               worker processes (0 = run in a thread of the API process)
+    ANALYSIS_TIMEOUT               seconds per request before 504
+    ANALYSIS_MAX_TASKS_PER_WORKER  tasks per worker before recycling (0 = never)
+    ANALYSIS_START_METHOD          multiprocessing start method (default spawn)
+"""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+ANALYSIS_WORKERS = int(os.environ.get('ANALYSIS_WORKERS', min(2, os.cpu_count() or 1)))
+ANALYSIS_TIMEOUT = float(os.environ.get('ANALYSIS_TIMEOUT', 30))
+ANALYSIS_MAX_TASKS_PER_WORKER = int(os.environ.get('ANALYSIS_MAX_TASKS_PER_WORKER', 200))
+ANALYSIS_START_METHOD = os.environ.get('ANALYSIS_START_METHOD', 'spawn')
+# seconds between SIGTERM and SIGKILL for a worker stuck past its timeout
+KILL_GRACE = 5
+
+
+class AnalysisTimeout(Exception):
+    pass
+
+
+def _with_pid(fn, *args):
+    # runs in a worker: (worker pid, fn(*args)), for AnalysisPool.each_worker()
+    return os.getpid(), fn(*args)
+
+
+class AnalysisPool:
+    """
+    Runs picklable module level functions in worker processes and awaits
+    them from the event loop, with a timeout per call.
+    """
+
+    def __init__(self, initializer=None, initargs=(), workers=ANALYSIS_WORKERS,
+                 timeout=ANALYSIS_TIMEOUT, max_tasks_per_worker=ANALYSIS_MAX_TASKS_PER_WORKER,
+                 start_method=ANALYSIS_START_METHOD):
+        """
+        initializer: module level function run once in every worker (model preload)
+        """
+        self.initializer = initializer
+        self.initargs = initargs
+        self.workers = workers
+        self.timeout = timeout
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.start_method = start_method
+        self._executor = None
+        self._submitted = 0
+        self._lock = threading.Lock()
+        self._stats = {'completed': 0, 'failed': 0, 'timeouts': 0, 'recycles': 0}
+
+    def start(self):
+        if self.workers <= 0:
+            # in-process mode: load models here, run tasks in the default thread pool
+            if self.initializer is not None:
+                self.initializer(*self.initargs)
+            return self
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._new_executor()
+        return self
+
+    def _new_executor(self):
+        self._submitted = 0
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(self.start_method),
+            initializer=self.initializer, initargs=self.initargs)
+
+    def _recycle(self, executor):
+        # swap in a fresh executor, the old one finishes its running tasks and exits
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = new = self._new_executor()
+            self._stats['recycles'] += 1
+        executor.shutdown(wait=False, cancel_futures=False)
+        self._prestart(new)
+
+    def _prestart(self, executor):
+        # workers start on demand, one trivial task per worker starts them all
+        # so they load their models before the next requests get there
+        for _ in range(self.workers):
+            executor.submit(os.getpid)
+
+    @staticmethod
+    def _processes(executor):
+        # ProcessPoolExecutor has no public API to kill a busy worker, and
+        # shutdown() drops its _processes, so take them before recycling
+        return list((getattr(executor, '_processes', None) or {}).values())
+
+    def _terminate(self, processes):
+        alive = [process for process in processes if process.is_alive()]
+        for process in alive:
+            process.terminate()
+        if alive:
+            # SIGKILL whatever ignored the SIGTERM
+            asyncio.get_event_loop().call_later(KILL_GRACE, self._kill, alive)
+
+    @staticmethod
+    def _kill(processes):
+        for process in processes:
+            if process.is_alive():
+                process.kill()
+
+    def _submit(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._new_executor()
+            executor = self._executor
+            self._submitted += 1
+            recycle = (self.max_tasks_per_worker > 0
+                       and self._submitted >= self.max_tasks_per_worker * self.workers)
+        return executor, recycle
+
+    async def run(self, fn, *args):
+        """
+        Run fn(*args) in a worker (fn and args must be picklable) and return
+        its result. Raises AnalysisTimeout after self.timeout seconds.
+        """
+        loop = asyncio.get_event_loop()
+        if self.workers <= 0:
+            future = loop.run_in_executor(None, fn, *args)
+            executor, recycle = None, False
+        else:
+            executor, recycle = self._submit()
+            future = loop.run_in_executor(executor, fn, *args)
+            if recycle:
+                self._recycle(executor)
+        try:
+            result = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self._stats['timeouts'] += 1
+            if executor is not None:
+                # the worker is still busy with this task, stop sending it new ones
+                processes = self._processes(executor)
+                self._recycle(executor)
+                loop.call_later(self.timeout, self._terminate, processes)
+            raise AnalysisTimeout("Analysis took longer than {}s".format(self.timeout))
+        except BrokenProcessPool:
+            self._stats['failed'] += 1
+            self._recycle(executor)
+            raise
+        except Exception:
+            self._stats['failed'] += 1
+            raise
+        self._stats['completed'] += 1
+        return result
+
+    async def each_worker(self, fn, *args, poll=0.1):
+        """
+        Run fn(*args) (picklable) once in every worker of the current executor.
+        One fast worker can take several tasks, so tasks are sent until
+        self.workers distinct pids have answered or self.timeout has passed.
+        return : {pid: result} of the workers that answered
+        """
+        if self.workers <= 0:
+            return {}
+        with self._lock:
+            if self._executor is None:
+                self._executor = self._new_executor()
+            executor = self._executor
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + self.timeout
+        results = {}
+        while len(results) < self.workers:
+            tasks = [loop.run_in_executor(executor, _with_pid, fn, *args)
+                     for _ in range(self.workers - len(results))]
+            done, pending = await asyncio.wait(tasks, timeout=max(0, deadline - loop.time()))
+            for task in done:
+                pid, result = task.result()
+                results.setdefault(pid, result)
+            if pending:
+                break
+            if len(results) < self.workers:
+                await asyncio.sleep(poll)
+        return results
+
+    async def wait_ready(self):
+        """
+        Wait until every worker has run the initializer (model preload): a task
+        only starts once its worker's initializer is done. Raises AnalysisTimeout
+        if not every worker answered within self.timeout.
+        return : the worker pids
+        """
+        pids = await self.each_worker(os.getpid)
+        if len(pids) < self.workers:
+            raise AnalysisTimeout("{} of {} workers ready after {}s".format(len(pids), self.workers, self.timeout))
+        return set(pids)
+
+    def stats(self):
+        return dict(self._stats, workers=self.workers, timeout_s=self.timeout,
+                    max_tasks_per_worker=self.max_tasks_per_worker)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
@@ -1,17 +1,27 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 import uvicorn
-from typing import Dict, Any
-import io
+from typing import List, Optional
+import asyncio
+import functools
+import json
 import os
 import sys
-from PIL import Image
-import numpy as np
+import time
 
 # Add parent directory to path to import personal_color_analysis
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
-from personal_color_analysis import personal_color
+from personal_color_analysis import model_registry, timing
+import admission
+import analysis_pool
+import engines
+import jobs
+import metrics
+import profiling
+import recommendations
+import result_cache
+import upload_limit
 
 app = FastAPI(
     title="Personal Color Analysis API",
@@ -19,28 +29,306 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Maximum number of images in one /analyze/batch request
+BATCH_MAX_FILES = int(os.environ.get('BATCH_MAX_FILES', 20))
+# Images of one /analyze/batch request analysed at the same time
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', admission.ADMISSION_CONCURRENCY))
+
+# Analysis paths and their endpoint label in pca_analysis_requests_total
+ANALYSIS_ENDPOINTS = {'/analyze': 'analyze', '/analyze/batch': 'batch', '/jobs': 'jobs'}
+
+def count_rejected(path, status):
+    """Count a request the middlewares answered (413, 503) before its handler ran"""
+    if path in ANALYSIS_ENDPOINTS:
+        count_outcome(ANALYSIS_ENDPOINTS[path], status)
+
+# Reject oversized bodies while they stream in (added before CORS so 413s still get CORS headers)
+app.add_middleware(
+    upload_limit.BodyLimitMiddleware,
+    path_limits={
+        '/analyze/batch': BATCH_MAX_FILES * (upload_limit.MAX_UPLOAD_BYTES + upload_limit.MULTIPART_OVERHEAD)
+    },
+    on_reject=count_rejected
+)
+
+# Bounded number of requests in the service, 503 + Retry-After beyond it (before the body is read)
+admission_control = admission.AdmissionControl()
+app.add_middleware(
+    admission.AdmissionMiddleware,
+    control=admission_control,
+    paths=list(ANALYSIS_ENDPOINTS),
+    on_reject=count_rejected
+)
+
 # Configure CORS
+# CORS_POLICY picks the policy of a deployment: 'open' also allows any other origin
+# (the fallback the clients of this service rely on), 'strict' only the origins
+# below and the Vercel previews (the random deployment, api_simple.py)
+CORS_POLICY = os.environ.get('CORS_POLICY', 'open')
+if CORS_POLICY not in ('open', 'strict'):
+    raise ValueError(f"Unknown CORS_POLICY: {CORS_POLICY} (open or strict)")
+
 # Allowed origins - add all deployment domains here
 allowed_origins = [
     "http://localhost:3000",
-    "http://localhost:5173", 
+    "http://localhost:5173",
     "http://localhost:5174",
+    "http://localhost:5001",
     "https://pca-hijab.vercel.app",
-    "https://noorai-ashy.vercel.app",
     "https://noorai.vercel.app",
-    "*"  # Allow all origins as fallback
+    "https://noorai-ashy.vercel.app",
+    "https://pca-hijab-frontend.vercel.app"
 ]
 
+if CORS_POLICY == 'open':
+    cors_options = dict(
+        allow_origins=allowed_origins + ["*"],  # Allow all origins as fallback
+        allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
+        allow_headers=["Content-Type", "Authorization", "Accept", "Origin", "Cache-Control", "X-Requested-With", "If-None-Match"]
+    )
+    # explicit CORS headers of /analyze responses
+    cors_response_headers = {
+        "Access-Control-Allow-Origin": "*",
+        "Access-Control-Allow-Methods": "POST, OPTIONS",
+        "Access-Control-Allow-Headers": "Content-Type, Authorization"
+    }
+else:
+    cors_options = dict(
+        allow_origins=allowed_origins,
+        # Vercel preview deployments
+        allow_origin_regex=r'^https://(pca-hijab|noorai)(-[a-z0-9]+)?\.vercel\.app$',
+        allow_methods=["GET", "POST", "OPTIONS"],
+        allow_headers=["Content-Type", "Accept"]
+    )
+    cors_response_headers = {}
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=allowed_origins,
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS", "PATCH"],
-    allow_headers=["Content-Type", "Authorization", "Accept", "Origin", "Cache-Control", "X-Requested-With"],
-    expose_headers=["Content-Length", "Content-Type"],
-    max_age=3600
+    expose_headers=["Content-Length", "Content-Type", "ETag", "X-Cache", "X-Engine", "Retry-After"],
+    max_age=3600,
+    **cors_options
 )
 
+# Engine of this deployment (ANALYSIS_ENGINE) and the ones a request may pick with ?engine=
+DEFAULT_ENGINE = engines.ANALYSIS_ENGINE
+ENABLED_ENGINES = engines.enabled_engines(DEFAULT_ENGINE)
+POOL_ENGINES = tuple(name for name in ENABLED_ENGINES if not engines.get_engine(name).inline)
+
+# Engines run in worker processes, each loading the models of the enabled engines once
+pool = analysis_pool.AnalysisPool(initializer=engines.preload, initargs=(POOL_ENGINES,))
+engine_stats = engines.EngineStats()
+
+ALLOWED_CONTENT_TYPES = ["image/jpeg", "image/jpg", "image/png"]
+FACE_NOT_DETECTED = "Face not detected in the image"
+
+# Prometheus metrics served by /metrics (gauges are read from the stats of each component at scrape time)
+registry = metrics.Registry()
+analysis_requests = registry.counter(
+    'pca_analysis_requests', "Analyses by endpoint and outcome", ['endpoint', 'outcome'])
+upload_bytes = registry.histogram(
+    'pca_upload_bytes', "Size of the accepted uploads in bytes", metrics.UPLOAD_BUCKETS, ['endpoint'])
+decoded_pixels = registry.histogram(
+    'pca_decoded_pixels', "Pixels of the images after decoding (and downscaling)", metrics.PIXEL_BUCKETS)
+analysis_memory = registry.histogram(
+    'pca_analysis_peak_memory_bytes', "Peak memory allocated by one analysis (tracemalloc)", metrics.MEMORY_BUCKETS)
+analysis_rss = registry.histogram(
+    'pca_analysis_rss_delta_bytes', "Growth of the worker RSS over one analysis", metrics.RSS_DELTA_BUCKETS)
+
+def count_outcome(endpoint, status, detail=None):
+    analysis_requests.inc(endpoint=endpoint, outcome=metrics.outcome(status, detail == FACE_NOT_DETECTED))
+
+def counted(endpoint, success=True):
+    """
+    Count the requests of an endpoint by outcome (HTTPException or response status)
+    success: False only counts the failures, for endpoints whose analyses are counted elsewhere
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            try:
+                response = await handler(*args, **kwargs)
+            except HTTPException as e:
+                count_outcome(endpoint, e.status_code, e.detail)
+                raise
+            status = getattr(response, 'status_code', 200)
+            if success or status >= 300:
+                count_outcome(endpoint, status)
+            return response
+        return wrapper
+    return decorator
+
+def check_upload(file):
+    """Error message for an unsupported upload type, None if it is fine"""
+    if not file.content_type in ALLOWED_CONTENT_TYPES:
+        return "Only JPG, JPEG, PNG formats are supported"
+    return None
+
+def select_engine(name):
+    """Engine a request asked for (the deployment default if none), 400 if it is not enabled"""
+    name = name or DEFAULT_ENGINE
+    if name not in ENABLED_ENGINES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown engine: {name} (available: {', '.join(ENABLED_ENGINES)})"
+        )
+    return engines.get_engine(name)
+
+def format_result(result, engine, debug=False, measurement=None):
+    """
+    Response body (season, recommended colors) for an engine result
+    measurement: engines.run_engine() measurement of the analysis behind it,
+    its stage timings and memory are added to the debug payload
+    """
+    recommendation = recommendations.recommendation_for(result['season'])
+    confidence = result.get('confidence')
+    
+    response = {
+        'personal_color': recommendation['personal_color'],
+        'personal_color_en': recommendation['personal_color_en'],
+        'confidence': recommendations.DEFAULT_CONFIDENCE if confidence is None else confidence,
+        'best_colors': recommendation['best_colors'],
+        'worst_colors': recommendation['worst_colors']
+    }
+    
+    if debug:
+        response['debug'] = dict(result.get('debug', {}), engine=engine.name)
+        # None for cached results, nothing was analysed for this request
+        response['debug']['timing_ms'] = timing.as_ms(measurement['stages']) if measurement else None
+        response['debug']['memory'] = measurement['memory'] if measurement else None
+        if measurement and measurement['profile']:
+            response['debug']['profile'] = measurement['profile']
+    return response
+
+# Results of already analysed uploads, keyed by content hash + engine and its version
+cache = result_cache.ResultCache()
+
+async def run_engine(engine, contents, filename, bounded=True, profile=False):
+    """
+    (engine result, engines.run_engine() measurement) of an upload, recording
+    the engine's latency and memory and feeding the stage histogram.
+    Waits for an analysis slot, raises admission.Overloaded if none frees up
+    in time (bounded=False waits as long as it takes, for background jobs).
+    profile: profile this analysis (otherwise PROFILE_SAMPLE_RATE of them are)
+    """
+    profile = profile or profiling.sampled()
+    try:
+        async with admission_control.slot(bounded):
+            if engine.inline:
+                result, measurement = engines.run_engine(engine.name, contents, filename, profile)
+            else:
+                result, measurement = await pool.run(engines.run_engine, engine.name, contents, filename, profile)
+    except admission.Overloaded:
+        raise
+    except Exception:
+        engine_stats.record_error(engine.name)
+        raise
+    engine_stats.record(engine.name, measurement)
+    timing.observe(measurement['stages'])
+    pixels = measurement['values'].get('decoded_pixels')
+    if pixels is not None:
+        decoded_pixels.observe(pixels)
+    if 'peak_bytes' in measurement['memory']:
+        analysis_memory.observe(measurement['memory']['peak_bytes'])
+    if 'rss_delta_bytes' in measurement['memory']:
+        # memory given back during the analysis counts as no growth
+        analysis_rss.observe(max(0, measurement['memory']['rss_delta_bytes']))
+    return result, measurement
+
+# Identical uploads analysed at the same time share one analysis
+inflight = result_cache.SingleFlight()
+
+async def analyze_and_cache(engine, contents, filename, key, bounded):
+    result, measurement = await run_engine(engine, contents, filename, bounded)
+    cache.set(key, {'result': result})
+    return result, measurement
+
+async def analyze_contents(contents, filename, engine, bounded=True, profile=False):
+    """
+    Engine result of an upload, its cache key, where it came from ('HIT',
+    'MISS' or 'COALESCED' with an identical upload in flight) and the
+    measurement of the analysis (None for cache hits).
+    Cached results (including 'no face') skip decoding and analysis,
+    unless the analysis is to be profiled.
+    """
+    key = result_cache.content_key(contents, '{}-{}'.format(engine.name, engine.version))
+    if not engine.cacheable or profile:
+        result, measurement = await run_engine(engine, contents, filename, bounded, profile)
+        return result, key, 'MISS', measurement
+    cached = cache.get(key)
+    if cached is not result_cache.MISS:
+        return cached['result'], key, 'HIT', None
+    (result, measurement), coalesced = await inflight.do(
+        key, analyze_and_cache, engine, contents, filename, key, bounded)
+    return result, key, 'COALESCED' if coalesced else 'MISS', measurement
+
+def etag_for(key, debug):
+    return '"{}{}"'.format(key, '-debug' if debug else '')
+
+async def run_job(contents, filename, engine, debug):
+    """Response body of an analysis job, jobs.JobFailed with the HTTP status /analyze would answer"""
+    try:
+        result, _, _, measurement = await analyze_contents(contents, filename, engine, bounded=False)
+    except admission.Overloaded as e:
+        raise jobs.JobFailed(503, str(e))
+    except analysis_pool.AnalysisTimeout as e:
+        raise jobs.JobFailed(504, str(e))
+    if result is None:
+        raise jobs.JobFailed(400, FACE_NOT_DETECTED)
+    return format_result(result, engine, debug, measurement)
+
+def count_job(job):
+    error = job.get('error')
+    if error:
+        count_outcome('jobs', error['status'], error['detail'])
+    else:
+        count_outcome('jobs', 200)
+
+# Background analyses: POST /jobs returns at once, workers here await the analysis pool
+job_queue = jobs.JobQueue(run_job, on_finished=count_job)
+
+# Warm-up state reported by /ready: models loaded and one analysis run in every worker
+warmup = {'status': 'warming_up', 'started_at': None, 'duration_s': None, 'workers': 0, 'error': None}
+
+async def warm_up():
+    """
+    Start the analysis workers and wait until each has loaded its models and
+    run its warm-up analysis (the pool initializer), then mark the service ready
+    """
+    loop = asyncio.get_event_loop()
+    warmup['started_at'] = time.time()
+    start = time.perf_counter()
+    try:
+        # in-process mode runs the initializer in start(), keep it off the event loop
+        await loop.run_in_executor(None, pool.start)
+        # every worker answered, so every worker has run its initializer
+        warmup['workers'] = len(await pool.wait_ready())
+        inline = [name for name in ENABLED_ENGINES if name not in POOL_ENGINES]
+        await loop.run_in_executor(None, engines.preload, inline)
+        for name in ENABLED_ENGINES:
+            # cache versions import the engine modules in this process
+            engines.get_engine(name).version
+    except Exception as e:
+        # serve anyway, requests report the error; holding traffic forever would not help
+        print(f"Warm-up failed: {str(e)}")
+        warmup['error'] = str(e)
+    warmup['duration_s'] = round(time.perf_counter() - start, 3)
+    warmup['status'] = 'ready'
+
+@app.on_event("startup")
+async def start_pool():
+    """Start the analysis workers in the background (models are loaded once per worker process)"""
+    job_queue.start()
+    if POOL_ENGINES:
+        asyncio.ensure_future(warm_up())
+    else:
+        warmup['status'] = 'ready'
+
+@app.on_event("shutdown")
+async def stop_pool():
+    await job_queue.shutdown()
+    pool.shutdown()
+
 @app.get("/")
 async def root():
     return {"message": "Personal Color Analysis API is running"}
@@ -49,10 +337,116 @@ async def root():
 async def health_check():
     return {
         "status": "ok",
-        "service": "personal-color-analysis"
+        "service": "personal-color-analysis",
+        "engine": DEFAULT_ENGINE
     }
 
-@app.options("/analyze")
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness probe: 503 until the warm-up finished, so the load balancer
+    holds traffic while models load (/health only tells the process is up)
+    """
+    status_code = 200 if warmup['status'] == 'ready' else 503
+    return JSONResponse(content=dict(warmup, engines=ENABLED_ENGINES), status_code=status_code)
+
+@app.get("/models")
+async def model_status():
+    """
+    Load time and memory footprint of the shared analysis models. They are
+    loaded in the analysis workers, so every worker that answers reports its own
+    """
+    if not POOL_ENGINES or pool.workers <= 0:
+        return {'workers': [engines.model_stats()]}
+    workers = await pool.each_worker(engines.model_stats)
+    if not workers:
+        raise HTTPException(status_code=503, detail="No analysis worker answered")
+    return {'workers': [workers[pid] for pid in sorted(workers)]}
+
+@app.get("/engines")
+async def engine_status():
+    """
+    Enabled engines with their load time, latency percentiles and worker
+    memory, to compare what each engine costs per request
+    """
+    return {
+        'default': DEFAULT_ENGINE,
+        'engines': engine_stats.stats(ENABLED_ENGINES)
+    }
+
+@app.get("/timing")
+async def timing_status():
+    """Aggregate histogram of the analysis stage times (decode, detect, landmarks, ...)"""
+    return timing.histogram.stats()
+
+@app.get("/admission")
+async def admission_status():
+    """Requests in flight, queue depth and wait times, for the proxy and the autoscaler"""
+    return admission_control.stats()
+
+@app.get("/profiles")
+async def profile_list(request: Request, limit: int = 20):
+    """
+    Tags (engine, image size, stage timings) of the latest profiles written to
+    PROFILE_DIR, for requests with X-Profile: <PROFILE_TOKEN> only (404 otherwise)
+    """
+    if not profiling.requested(request.headers.get('x-profile')):
+        raise HTTPException(status_code=404, detail="Not Found")
+    return {
+        'dir': profiling.PROFILE_DIR,
+        'sample_rate': profiling.PROFILE_SAMPLE_RATE,
+        'mode': profiling.PROFILE_MODE,
+        'profiles': profiling.recent(limit)
+    }
+
+@app.get("/cache")
+async def cache_stats():
+    """Hit / miss counters of the result cache and the analyses saved by coalescing"""
+    return dict(cache.stats(), singleflight=inflight.stats())
+
+@registry.collector
+def service_metrics():
+    """Gauges and counters kept by the admission control, job queue, caches and pool"""
+    admission_stats = admission_control.stats()
+    job_stats = job_queue.stats()
+    cache_stats = cache.stats()
+    singleflight = inflight.stats()
+    pool_stats = pool.stats()
+    stage_samples = [
+        sample
+        for name, entry in timing.histogram.snapshot().items()
+        for sample in metrics.histogram_samples(
+            'pca_stage_duration_seconds', {'stage': name}, entry['buckets'], entry['count'], entry['sum'])
+    ]
+    return [
+        ('pca_stage_duration_seconds', 'histogram', "Time spent in each analysis stage", stage_samples),
+        ('pca_analyses_in_flight', 'gauge', "Admitted analysis requests (running or waiting for a slot)",
+         [({}, admission_stats['in_flight'])]),
+        ('pca_analyses_running', 'gauge', "Analyses holding a slot", [({}, admission_stats['running'])]),
+        ('pca_analyses_queued', 'gauge', "Analyses waiting for a slot", [({}, admission_stats['queue_depth'])]),
+        ('pca_admission_rejected', 'counter', "Requests answered 503 by admission control",
+         [({'reason': 'full'}, admission_stats['rejected']),
+          ({'reason': 'queue_timeout'}, admission_stats['queue_timeouts'])]),
+        ('pca_jobs', 'gauge', "Jobs by status",
+         [({'status': jobs.QUEUED}, job_stats['queued']), ({'status': jobs.RUNNING}, job_stats['running'])]),
+        ('pca_cache_lookups', 'counter', "Result cache lookups by result",
+         [({'result': 'hit'}, cache_stats['hits']), ({'result': 'disk_hit'}, cache_stats['disk_hits']),
+          ({'result': 'miss'}, cache_stats['misses'])]),
+        ('pca_cache_hit_ratio', 'gauge', "Result cache hits (memory and disk) per lookup",
+         [({}, cache_stats['hit_rate'])]),
+        ('pca_cache_entries', 'gauge', "Results in the in-memory cache", [({}, cache_stats['entries'])]),
+        ('pca_coalesced_analyses', 'counter', "Requests that shared an identical in-flight analysis",
+         [({}, singleflight['coalesced'])]),
+        ('pca_pool_tasks', 'counter', "Analysis pool tasks by result",
+         [({'result': key}, pool_stats[key]) for key in ('completed', 'failed', 'timeouts', 'recycles')]),
+        ('pca_ready', 'gauge', "1 once the warm-up finished", [({}, int(warmup['status'] == 'ready'))]),
+    ]
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Request outcomes, stage latencies, queue depths and cache ratios in the Prometheus text format"""
+    return Response(content=registry.render(), media_type=metrics.CONTENT_TYPE)
+
 async def options_analyze():
     """Handle preflight requests"""
     # Return appropriate CORS headers for preflight
@@ -67,120 +461,71 @@ async def options_analyze():
         }
     )
 
+if CORS_POLICY == 'open':
+    app.options("/analyze")(options_analyze)
+
 @app.post("/analyze")
+@counted('analyze')
 async def analyze_personal_color(
+    request: Request,
     file: UploadFile = File(...),
-    debug: bool = False
+    debug: bool = False,
+    engine: Optional[str] = None
 ):
     """
     Analyze uploaded image to determine personal color
+    (engine: one of the enabled engines, the deployment default if not given)
     """
+    engine = select_engine(engine)
+    
     # Check file format
-    if not file.content_type in ["image/jpeg", "image/jpg", "image/png"]:
+    error = check_upload(file)
+    if error:
         raise HTTPException(
             status_code=400,
-            detail="Only JPG, JPEG, PNG formats are supported"
+            detail=error
         )
     
-    # Check file size (max 10MB)
-    contents = await file.read()
-    if len(contents) > 10 * 1024 * 1024:
-        raise HTTPException(
-            status_code=400,
-            detail="File size must be less than 10MB"
-        )
+    # Read the upload in chunks, giving up as soon as it is over the size limit
+    contents = await upload_limit.read_upload(file)
+    upload_bytes.observe(len(contents), endpoint='analyze')
+    # 413 for a decompression bomb, before anything is decoded
+    upload_limit.check_image(contents)
     
     try:
-        # Save uploaded file temporarily
-        temp_filename = f"temp_{file.filename}"
-        temp_path = os.path.join("/tmp", temp_filename)
-        
-        with open(temp_path, "wb") as f:
-            f.write(contents)
-        
-        # Analyze personal color
-        result = personal_color.analysis(temp_path)
-        
-        # Clean up temp file
-        os.remove(temp_path)
+        # Analyze personal color straight from the uploaded bytes, off the event loop
+        # X-Profile: <PROFILE_TOKEN> profiles this analysis (see GET /profiles)
+        profile = profiling.requested(request.headers.get('x-profile'))
+        result, key, cache_status, measurement = await analyze_contents(
+            contents, file.filename, engine, profile=profile)
+        etag = etag_for(key, debug) if engine.cacheable else None
+        if result is not None and etag and request.headers.get('if-none-match') == etag:
+            return Response(status_code=304, headers={'ETag': etag})
         
         # Format response based on analysis result
         if result is None:
             raise HTTPException(
                 status_code=400,
-                detail="Face not detected in the image"
+                detail=FACE_NOT_DETECTED
             )
         
-        # Extract season and convert to response format
-        season = result.get('season', 'unknown')
-        
-        # Map Korean seasons to English
-        season_map = {
-            '봄': 'spring',
-            '여름': 'summer',
-            '가을': 'autumn',
-            '겨울': 'winter'
-        }
-        
-        season_en = season_map.get(season, season)
-        
-        # Define best and worst colors for each season
-        color_recommendations = {
-            'spring': {
-                'personal_color': '봄 웜톤',
-                'personal_color_en': 'Spring Warm',
-                'best_colors': ['#FFB3BA', '#FFCC99', '#FFFFCC', '#CCFFCC'],
-                'worst_colors': ['#4A4A4A', '#000080', '#800080', '#2F4F4F']
-            },
-            'summer': {
-                'personal_color': '여름 쿨톤',
-                'personal_color_en': 'Summer Cool',
-                'best_colors': ['#E6E6FA', '#FFE4E1', '#F0E68C', '#DDA0DD'],
-                'worst_colors': ['#FF4500', '#FF6347', '#DC143C', '#8B4513']
-            },
-            'autumn': {
-                'personal_color': '가을 웜톤',
-                'personal_color_en': 'Autumn Warm',
-                'best_colors': ['#CD853F', '#D2691E', '#B8860B', '#8B4513'],
-                'worst_colors': ['#FF69B4', '#FF1493', '#C71585', '#DB7093']
-            },
-            'winter': {
-                'personal_color': '겨울 쿨톤',
-                'personal_color_en': 'Winter Cool',
-                'best_colors': ['#4169E1', '#0000CD', '#191970', '#000080'],
-                'worst_colors': ['#FFD700', '#FFA500', '#FF8C00', '#FF7F50']
-            }
-        }
-        
-        recommendation = color_recommendations.get(season_en, color_recommendations['spring'])
+        response = format_result(result, engine, debug, measurement)
         
-        response = {
-            'personal_color': recommendation['personal_color'],
-            'personal_color_en': recommendation['personal_color_en'],
-            'confidence': 85.0,  # Placeholder confidence score
-            'best_colors': recommendation['best_colors'],
-            'worst_colors': recommendation['worst_colors']
-        }
-        
-        if debug:
-            response['debug'] = {
-                'detected_season': season,
-                'face_detected': True,
-                'analysis_details': result
-            }
-        
-        # Return response with explicit CORS headers
-        return JSONResponse(
-            content=response,
-            headers={
-                "Access-Control-Allow-Origin": "*",
-                "Access-Control-Allow-Methods": "POST, OPTIONS",
-                "Access-Control-Allow-Headers": "Content-Type, Authorization"
-            }
+        # Return response with explicit CORS headers (open policy)
+        headers = dict(
+            cors_response_headers,
+            **{"X-Cache": cache_status, "X-Engine": engine.name}
         )
+        if etag:
+            headers["ETag"] = etag
+        return JSONResponse(content=response, headers=headers)
         
     except HTTPException:
         raise
+    except admission.Overloaded as e:
+        return admission.overloaded_response(e.retry_after)
+    except analysis_pool.AnalysisTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
     except Exception as e:
         import traceback
         error_details = f"Analysis failed: {str(e)}\nTraceback: {traceback.format_exc()}"
@@ -190,6 +535,152 @@ async def analyze_personal_color(
             detail=f"Analysis failed: {str(e)}"
         )
 
-if __name__ == "__main__":
+async def read_batch_item(file):
+    """(contents, error) of one /analyze/batch upload, error is an HTTPException"""
+    error = check_upload(file)
+    if error:
+        return None, HTTPException(status_code=400, detail=error)
+    try:
+        contents = await upload_limit.read_upload(file)
+    except HTTPException as e:
+        return None, e
+    upload_bytes.observe(len(contents), endpoint='batch')
+    try:
+        upload_limit.check_image(contents)
+    except HTTPException as e:
+        return None, e
+    return contents, None
+
+async def analyze_batch_item(index, file, contents, error, debug, engine, limit):
+    """
+    One NDJSON record of /analyze/batch, errors are reported per image.
+    The batch was admitted as one request, so its images wait for a slot
+    without the queue timeout, at most `limit` (semaphore) at a time.
+    """
+    record = {'index': index, 'filename': file.filename}
+    if error:
+        return dict(record, status=error.status_code, detail=error.detail)
+    try:
+        async with limit:
+            result, _, _, measurement = await analyze_contents(contents, file.filename, engine, bounded=False)
+    except admission.Overloaded as e:
+        return dict(record, status=503, detail=str(e), retry_after=e.retry_after)
+    except analysis_pool.AnalysisTimeout as e:
+        return dict(record, status=504, detail=str(e))
+    except Exception as e:
+        print(f"Analysis failed for {file.filename}: {str(e)}")
+        return dict(record, status=500, detail=f"Analysis failed: {str(e)}")
+    if result is None:
+        return dict(record, status=400, detail=FACE_NOT_DETECTED)
+    return dict(record, status=200, result=format_result(result, engine, debug, measurement))
+
+@app.post("/analyze/batch")
+@counted('batch', success=False)
+async def analyze_personal_color_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    debug: bool = False,
+    engine: Optional[str] = None
+):
+    """
+    Analyze several images in one request. The images are spread over the
+    analysis workers and one NDJSON line is streamed per image as soon as it
+    is done (in completion order, 'index' is the position in the upload).
+    """
+    engine = select_engine(engine)
+    # a batch larger than the admission capacity could never be admitted
+    max_files = min(BATCH_MAX_FILES, admission_control.capacity)
+    if len(files) > max_files:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {max_files} files per batch"
+        )
+    
+    # every image holds memory like a request of its own: the middleware admitted
+    # the first one, the others take an admission each before they are read
+    try:
+        admission_control.admit_more(request, len(files) - 1)
+    except admission.Overloaded as e:
+        return admission.overloaded_response(e.retry_after)
+    
+    # read every upload before streaming, the form is closed once the handler returns
+    uploads = [await read_batch_item(file) for file in files]
+    limit = asyncio.Semaphore(max(1, BATCH_CONCURRENCY))
+    tasks = [asyncio.ensure_future(analyze_batch_item(i, file, contents, error, debug, engine, limit))
+             for i, (file, (contents, error)) in enumerate(zip(files, uploads))]
+    
+    async def stream():
+        try:
+            for task in asyncio.as_completed(tasks):
+                record = await task
+                count_outcome('batch', record['status'], record.get('detail'))
+                yield json.dumps(record, ensure_ascii=False) + "\n"
+        finally:
+            # client went away: drop the images that have not started yet
+            for task in tasks:
+                task.cancel()
+    
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+@app.post("/jobs", status_code=202)
+@counted('jobs', success=False)
+async def create_job(
+    file: UploadFile = File(...),
+    debug: bool = False,
+    engine: Optional[str] = None
+):
+    """
+    Queue an analysis and return its job id right away. The result is read
+    with GET /jobs/{id} (?wait=<seconds> to long-poll) or followed with
+    GET /jobs/{id}/events (server-sent events).
+    """
+    engine = select_engine(engine)
+    error = check_upload(file)
+    if error:
+        raise HTTPException(
+            status_code=400,
+            detail=error
+        )
+    contents = await upload_limit.read_upload(file)
+    upload_bytes.observe(len(contents), endpoint='jobs')
+    upload_limit.check_image(contents)
+    try:
+        job = job_queue.submit(contents, file.filename, engine, debug)
+    except jobs.QueueFull:
+        return admission.overloaded_response(admission_control.retry_after())
+    return JSONResponse(content=job, status_code=202, headers={"Location": f"/jobs/{job['id']}"})
+
+@app.get("/jobs")
+async def job_stats():
+    """Queued / running jobs and job counters"""
+    return job_queue.stats()
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str, wait: float = 0):
+    """
+    Status of a job, with its result (or error) once it is finished.
+    wait: seconds to hold the request until the job is finished (long-poll)
+    """
+    job = await job_queue.wait(job_id, wait) if wait > 0 else job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """Server-sent events with the job on every status change, ending when it is finished"""
+    if job_queue.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def stream():
+        async for job in job_queue.events(job_id):
+            yield f"event: {job['status']}\ndata: {json.dumps(job, ensure_ascii=False)}\n\n"
+    
+    return StreamingResponse(stream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+def main():
     port = int(os.environ.get("PORT", 8000))
     uvicorn.run(app, host="0.0.0.0", port=port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+NumPy sRGB -> Lab / HSV conversion vs. colormath: maximum difference and
+time per color, on random colors plus the black/white/gray corners.
+
+    python src/benchmarks/color_convert.py --colors 2000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from colormath.color_conversions import convert_color
+from colormath.color_objects import HSVColor, LabColor, sRGBColor
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from personal_color_analysis import color_convert
+
+
+def colormath_features(colors):
+    lab, hsv = [], []
+    for c in colors:
+        rgb = sRGBColor(c[0], c[1], c[2], is_upscaled=True)
+        lab.append(convert_color(rgb, LabColor, through_rgb_type=sRGBColor).get_value_tuple())
+        hsv.append(convert_color(rgb, HSVColor, through_rgb_type=sRGBColor).get_value_tuple())
+    return np.array(lab), np.array(hsv)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='color_convert vs. colormath')
+    parser.add_argument('--colors', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    colors = np.concatenate([rng.random((args.colors, 3)) * 255,
+                             [[0, 0, 0], [255, 255, 255], [128, 128, 128], [1, 0, 0]]])
+
+    start = time.perf_counter()
+    lab_ref, hsv_ref = colormath_features(colors)
+    ref_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    lab, hsv = color_convert.rgb_to_lab(colors), color_convert.rgb_to_hsv(colors)
+    np_ms = (time.perf_counter() - start) * 1000
+
+    # features as used by the analysis: 2 decimal rounding must give identical values
+    lab_b, hsv_s = color_convert.lab_b_hsv_s(colors)
+    same = ((lab_b == [float(format(v, '.2f')) for v in lab_ref[:, 2]]).all()
+            and (hsv_s == [float(format(v, '.2f')) * 100 for v in hsv_ref[:, 1]]).all())
+
+    print('colors            {}'.format(len(colors)))
+    print('max |dLab|        {:.2e}'.format(np.abs(lab - lab_ref).max()))
+    print('max |dHSV|        {:.2e}'.format(np.abs(hsv - hsv_ref).max()))
+    print('rounded features  {}'.format('identical' if same else 'DIFFERENT'))
+    print('colormath         {:.1f} ms'.format(ref_ms))
+    print('numpy             {:.2f} ms ({:.0f}x)'.format(np_ms, ref_ms / np_ms))
+
+
+if __name__ == '__main__':
+    main()
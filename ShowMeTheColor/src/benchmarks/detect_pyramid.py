@@ -0,0 +1,63 @@
+"""
+Face detection latency at several input sizes: full resolution detection
+(upsample=1, the original behaviour) vs. the size-capped detection pyramid.
+
+    python src/benchmarks/detect_pyramid.py --image res/test/nspring/1.jpg
+"""
+import argparse
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from personal_color_analysis import face_backends
+from personal_color_analysis.detect_face import DetectFace
+
+DEFAULT_IMAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..', 'res', 'test', 'nspring', '1.jpg')
+
+
+def time_detection(img, detect_max_side, repeat):
+    times = []
+    df = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df = DetectFace(img, detect_max_side=detect_max_side)
+        times.append(time.perf_counter() - start)
+    return np.median(times) * 1000, df
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DetectFace latency by input size')
+    parser.add_argument('--image', default=DEFAULT_IMAGE, help='input .jpg or .png file')
+    parser.add_argument('--megapixels', default='0.25,1,4,12', help='comma separated input sizes')
+    parser.add_argument('--max-side', type=int, default=DetectFace.DETECT_MAX_SIDE)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    face_backends.preload()
+    base = cv2.imread(args.image)
+    if base is None:
+        sys.exit('Could not read {}'.format(args.image))
+
+    print('{:>8} {:>12} {:>14} {:>14} {:>8} {:>10}'.format(
+        'MP', 'size', 'full-res(ms)', 'pyramid(ms)', 'speedup', 'max dl(px)'))
+    for mp in [float(v) for v in args.megapixels.split(',')]:
+        h, w = base.shape[:2]
+        f = np.sqrt(mp * 1e6 / (h * w))
+        img = cv2.resize(base, (int(w * f), int(h * f)), interpolation=cv2.INTER_CUBIC)
+
+        full_ms, full = time_detection(img, None, args.repeat)
+        pyr_ms, pyr = time_detection(img, args.max_side, args.repeat)
+        # landmark disagreement after back-projection, in full-res pixels
+        landmark_err = np.abs(full.landmarks - pyr.landmarks).max()
+        print('{:>8.2f} {:>12} {:>14.1f} {:>14.1f} {:>7.1f}x {:>10d}'.format(
+            mp, '{}x{}'.format(img.shape[1], img.shape[0]), full_ms, pyr_ms,
+            full_ms / pyr_ms, int(landmark_err)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+DominantColors engine benchmark: sklearn KMeans vs. the float32 NumPy k-means
+on every pixel vs. the histogram-quantized weighted mode, and the per-region
+loop vs. batch_dominant_colors() over all regions at once.
+
+Regions are square crops from the centre of the bundled res/test images
+(no face detection needed), at several pixel counts.
+
+    python src/benchmarks/dominant_colors.py --sizes 16,64,256
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from personal_color_analysis.color_extract import DominantColors, batch_dominant_colors
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'res', 'test')
+
+
+def load_regions(size, limit):
+    regions = []
+    for path in sorted(glob.glob(os.path.join(TEST_DIR, '*', '*')))[:limit]:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        h, w = img.shape[:2]
+        crop = img[h // 2 - h // 8:h // 2 + h // 8, w // 2 - w // 8:w // 2 + w // 8]
+        regions.append(cv2.resize(crop, (size, size), interpolation=cv2.INTER_AREA).reshape(-1, 3))
+    return regions
+
+
+def dominant(pixels, clusters, **kwargs):
+    colors, _ = DominantColors(pixels, clusters, **kwargs).getHistogram()
+    return np.array(colors[0], dtype=float)
+
+
+def run(regions, clusters, **kwargs):
+    start = time.perf_counter()
+    colors = [dominant(r, clusters, **kwargs) for r in regions]
+    return (time.perf_counter() - start) * 1000 / len(regions), np.array(colors)
+
+
+def run_batch(regions, clusters, **kwargs):
+    start = time.perf_counter()
+    results = batch_dominant_colors(regions, clusters, **kwargs)
+    colors = [np.array(colors[0], dtype=float) for colors, _ in results]
+    return (time.perf_counter() - start) * 1000 / len(regions), np.array(colors)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DominantColors engine benchmark')
+    parser.add_argument('--sizes', default='16,64,256', help='region side lengths in pixels')
+    parser.add_argument('--clusters', type=int, default=4)
+    parser.add_argument('--limit', type=int, default=40, help='number of test images')
+    parser.add_argument('--bin-size', type=float, default=8, help='histogram mode bin size')
+    args = parser.parse_args()
+
+    print('{:>8} {:>12} {:>12} {:>8} {:>16} {:>16} {:>10} {:>12} {:>12} {:>14} {:>10}'.format(
+        'pixels', 'sklearn(ms)', 'numpy(ms)', 'speedup', 'sklearn rerun d', 'numpy vs sk d',
+        'hist(ms)', 'hist med d', 'hist max d', 'hist > bin(%)', 'batch(ms)'))
+    for size in [int(v) for v in args.sizes.split(',')]:
+        regions = load_regions(size, args.limit)
+        sk_ms, sk = run(regions, args.clusters, engine='sklearn')
+        _, sk_again = run(regions, args.clusters, engine='sklearn')
+        np_ms, nu = run(regions, args.clusters, engine='numpy', mode='full')
+        _, nu_again = run(regions, args.clusters, engine='numpy', mode='full')
+        hist_ms, hist = run(regions, args.clusters, engine='numpy', mode='histogram',
+                            bin_size=args.bin_size)
+        batch_ms, _ = run_batch(regions, args.clusters, mode='full')
+        assert (nu == nu_again).all(), 'numpy engine must be deterministic'
+        # median per-region distance (RGB units) between dominant colors
+        rerun = np.median(np.linalg.norm(sk - sk_again, axis=1))
+        diff = np.median(np.linalg.norm(sk - nu, axis=1))
+        # the bin size is not an error bound: also show the worst region and how many
+        # regions end up further than one bin size from the full clustering
+        hist_diff = np.linalg.norm(nu - hist, axis=1)
+        outside = 100 * np.mean(hist_diff > args.bin_size)
+        print('{:>8} {:>12.2f} {:>12.2f} {:>7.1f}x {:>16.2f} {:>16.2f} {:>10.2f} {:>12.2f} {:>12.2f} {:>14.1f} {:>10.2f}'.format(
+            size * size, sk_ms, np_ms, sk_ms / np_ms, rerun, diff, hist_ms,
+            np.median(hist_diff), hist_diff.max(), outside, batch_ms))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+"""
+Per-stage benchmark of the dlib analysis pipeline over the labelled
+res/test/{nspring,nsummer,nfall,nwinter} images: decode, face detection,
+landmarks, face regions, dominant colors, color conversion and tone
+classification are timed separately (timing.stage) and reported as
+mean / p50 / p95, with the peak memory of each step (tracemalloc, measured
+in a separate pass so it does not slow down the timed ones).
+
+The results are written as JSON; --baseline compares the p50s with an
+earlier run and exits with 1 if a stage got slower than --threshold (and by
+more than --min-delta-ms, sub-millisecond stages are mostly noise).
+
+    python src/benchmarks/stages.py --repeat 5 --output stages.json
+    python src/benchmarks/stages.py --baseline stages.json --output stages-new.json
+"""
+import argparse
+import contextlib
+import glob
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from personal_color_analysis import face_backends, image_decode, memory, personal_color, timing, tone_analysis
+from personal_color_analysis.color_extract import batch_dominant_colors
+from personal_color_analysis.detect_face import DetectFace
+
+TEST_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'res', 'test')
+SEASONS = ['spring', 'summer', 'fall', 'winter']
+# folder name -> tone_analysis.classify() label
+LABELS = {'spring': 'spring', 'summer': 'summer', 'fall': 'autumn', 'winter': 'winter'}
+STAGES = ['decode', 'detect', 'landmarks', 'face_regions', 'dominant_colors', 'color_convert', 'tone_analysis', 'total']
+
+
+def load_images():
+    images = []
+    for season in SEASONS:
+        for path in sorted(glob.glob(os.path.join(TEST_DIR, 'n' + season, '*'))):
+            with open(path, 'rb') as f:
+                images.append((os.path.relpath(path, TEST_DIR), LABELS[season], f.read()))
+    return images
+
+
+def analyse(data, peak=False):
+    '''
+    One image through the pipeline step by step, the way personal_color.analysis() runs it
+    return : ({stage: seconds}, {step: peak bytes}, label), label is None if no face was found
+    '''
+    peaks = {}
+
+    @contextlib.contextmanager
+    def step(name):
+        with memory.track(peak=peak) as usage:
+            yield
+        if peak:
+            peaks[name] = usage['peak_bytes']
+
+    start = time.perf_counter()
+    with timing.record() as stages:
+        with step('decode'):
+            img = image_decode.decode(data)
+        with step('face'):
+            try:
+                df = DetectFace(img)
+            except Exception:
+                return stages, peaks, None
+            parts = [getattr(df, part) for part in personal_color.FACE_PARTS]
+            del df
+        with step('dominant_colors'):
+            region_colors = batch_dominant_colors(parts, personal_color.CLUSTERS)
+        dominant = [np.array(colors[0]) for colors, _ in region_colors]
+        with step('color_convert'):
+            lab_b, hsv_s = personal_color.features([dominant])
+        with step('tone_analysis'):
+            labels, _, _ = tone_analysis.classify(lab_b, hsv_s)
+    stages['total'] = time.perf_counter() - start
+    return stages, peaks, labels[0]
+
+
+def summary(values, scale):
+    values = np.array(values) * scale
+    return {
+        'count': len(values),
+        'mean': round(float(values.mean()), 3),
+        'p50': round(float(np.percentile(values, 50)), 3),
+        'p95': round(float(np.percentile(values, 95)), 3),
+        'max': round(float(values.max()), 3)
+    }
+
+
+def run(images, repeat):
+    times = {name: [] for name in STAGES}
+    labels = {}
+    for _ in range(repeat):
+        for name, _, data in images:
+            stages, _, label = analyse(data)
+            labels[name] = label
+            if label is None:
+                continue
+            for stage, seconds in stages.items():
+                times[stage].append(seconds)
+
+    # memory in its own pass, tracemalloc slows the pipeline down
+    peaks = {}
+    tracing = tracemalloc.is_tracing()
+    for name, _, data in images:
+        _, step_peaks, _ = analyse(data, peak=True)
+        for step, value in step_peaks.items():
+            peaks.setdefault(step, []).append(value)
+    if not tracing:
+        tracemalloc.stop()
+
+    correct = sum(labels[name] == expected for name, expected, _ in images)
+    return {
+        'stages_ms': {name: summary(values, 1000) for name, values in times.items() if values},
+        'peak_memory_mb': {name: summary(values, 1 / (1 << 20)) for name, values in peaks.items()},
+        'images': len(images),
+        'faces_detected': sum(label is not None for label in labels.values()),
+        'correct': int(correct),
+        'no_face': sorted(name for name, label in labels.items() if label is None)
+    }
+
+
+def compare(result, baseline, threshold, min_delta_ms):
+    '''
+    p50 change per stage against a baseline run
+    return : names of the stages slower by more than threshold and min_delta_ms
+    '''
+    print('\n{:>16} {:>12} {:>12} {:>9}'.format('stage', 'base p50', 'p50', 'change'))
+    regressed = []
+    for name, stats in result['stages_ms'].items():
+        base = baseline['stages_ms'].get(name)
+        if not base or not base['p50']:
+            continue
+        change = stats['p50'] / base['p50'] - 1
+        flag = ''
+        if change > threshold and stats['p50'] - base['p50'] > min_delta_ms:
+            regressed.append(name)
+            flag = '  slower'
+        print('{:>16} {:>12.2f} {:>12.2f} {:>8.1f}%{}'.format(name, base['p50'], stats['p50'], change * 100, flag))
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-stage analysis benchmark over res/test')
+    parser.add_argument('--repeat', type=int, default=3, help='timed passes over the images')
+    parser.add_argument('--output', default='stages.json', help='JSON file the results are written to')
+    parser.add_argument('--baseline', help='JSON of an earlier run to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative p50 slowdown counted as a regression')
+    parser.add_argument('--min-delta-ms', type=float, default=0.5, help='smallest p50 slowdown counted as a regression')
+    args = parser.parse_args()
+
+    if not timing.ENABLED:
+        sys.exit('STAGE_TIMING=0 disables the stage timings this benchmark reads')
+    face_backends.preload()
+    images = load_images()
+    # one untimed pass: first-call costs (model pages, numpy / OpenCV init)
+    for _, _, data in images:
+        analyse(data)
+
+    result = run(images, args.repeat)
+    result['meta'] = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'repeat': args.repeat,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'opencv': cv2.__version__,
+        'face_backend': face_backends.DEFAULT_BACKEND,
+        'engine_version': personal_color.ENGINE_VERSION,
+        'decode_max_pixels': image_decode.MAX_PIXELS
+    }
+
+    print('{} images, {} faces, {} correct'.format(result['images'], result['faces_detected'], result['correct']))
+    print('\n{:>16} {:>9} {:>9} {:>9}'.format('stage', 'mean(ms)', 'p50(ms)', 'p95(ms)'))
+    for name, stats in result['stages_ms'].items():
+        print('{:>16} {:>9.2f} {:>9.2f} {:>9.2f}'.format(name, stats['mean'], stats['p50'], stats['p95']))
+    # 'face' is detect + landmarks + face_regions (DetectFace)
+    print('\n{:>16} {:>9} {:>9} {:>9}'.format('peak memory', 'mean(MB)', 'p95(MB)', 'max(MB)'))
+    for name, stats in result['peak_memory_mb'].items():
+        print('{:>16} {:>9.2f} {:>9.2f} {:>9.2f}'.format(name, stats['mean'], stats['p95'], stats['max']))
+
+    regressed = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressed = compare(result, json.load(f), args.threshold, args.min_delta_ms)
+    with open(args.output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print('\nwritten to {}'.format(args.output))
+    if regressed:
+        sys.exit('slower than the baseline: {}'.format(', '.join(regressed)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,416 @@
+"""
+Registry of the analysis engines one service can run.
+
+    dlib        face landmarks, k-means dominant colors and Lab / HSV tone analysis
+    mediapipe   season from the mean color of the detected face
+    standalone  season from the HSV / RGB means of the detected face
+    random      random season without any analysis (no models, runs inline)
+
+A deployment picks its default engine with ANALYSIS_ENGINE and the engines a
+request may ask for with ?engine=. Engines run in the analysis pool workers
+through run_engine(), which loads an engine once per worker and returns the
+load time, latency and worker memory with every result; EngineStats keeps
+those per engine in the API process so engines can be compared on cost.
+preload() also warms every engine up with one analysis of WARMUP_IMAGE,
+so imports, model loads and first-call costs are paid before traffic.
+
+Environment:
+    ANALYSIS_ENGINE          default engine (default dlib)
+    ANALYSIS_ENGINES         comma separated engines requests may select (default: the default engine)
+    HEURISTIC_FACE_BACKEND   face detector of the mediapipe / standalone engines (default mediapipe)
+    WARMUP                   0 disables the warm-up analysis (default 1)
+    WARMUP_IMAGE             image analysed by the warm-up (default res/test/nspring/10.jpg)
+"""
+import contextlib
+import os
+import random
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from personal_color_analysis import image_decode, memory, model_registry, timing
+import profiling
+import recommendations
+
+ANALYSIS_ENGINE = os.environ.get('ANALYSIS_ENGINE', 'dlib')
+ANALYSIS_ENGINES = [name.strip() for name in os.environ.get('ANALYSIS_ENGINES', '').split(',') if name.strip()]
+HEURISTIC_FACE_BACKEND = os.environ.get('HEURISTIC_FACE_BACKEND', 'mediapipe')
+WARMUP = os.environ.get('WARMUP', '1') != '0'
+WARMUP_IMAGE = os.environ.get('WARMUP_IMAGE', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', 'res', 'test', 'nspring', '10.jpg'))
+
+# latencies kept per engine for the percentiles
+LATENCY_WINDOW = 1000
+
+
+class Engine:
+    """
+    analyze(contents, filename) returns None when no face is found, else
+    {'season': English season, 'confidence': float or None, 'debug': {...}}.
+    load() loads the models of the engine in the current process.
+    """
+
+    def __init__(self, name, analyze, load=None, version='1', cacheable=True, inline=False):
+        """
+        version: str or function returning the cache version of the results
+        cacheable: False for engines whose result is not a function of the image
+        inline: cheap engines that run on the event loop instead of the pool
+        """
+        self.name = name
+        self.analyze = analyze
+        self.load = load
+        self._version = version
+        self.cacheable = cacheable
+        self.inline = inline
+
+    @property
+    def version(self):
+        if callable(self._version):
+            self._version = self._version()
+        return self._version
+
+
+def _load_dlib():
+    from personal_color_analysis import face_backends
+    face_backends.preload()
+
+
+def _dlib_version():
+    from personal_color_analysis import face_backends, personal_color
+    return 'v{}-{}-k{}'.format(
+        personal_color.ENGINE_VERSION, face_backends.DEFAULT_BACKEND, personal_color.CLUSTERS)
+
+
+def _analyze_dlib(contents, filename):
+    from personal_color_analysis import personal_color
+    result = personal_color.analysis(contents, filename)
+    if result is None:
+        return None
+    return {
+        'season': recommendations.season_en(result['season']),
+        'confidence': None,
+        'debug': {
+            'detected_season': result['season'],
+            'face_detected': True,
+            'analysis_details': result
+        }
+    }
+
+
+def _heuristic_backend():
+    from personal_color_analysis import face_backends
+    return face_backends.get_backend(HEURISTIC_FACE_BACKEND)
+
+
+def _detect_face(contents):
+    """
+    (face region, detection, channel order) of the best face, None if there is none.
+    The image is decoded once, in the channel order the detector takes.
+    """
+    face_backend = _heuristic_backend()
+    image = image_decode.decode(contents, layout=face_backend.color_order)
+    with timing.stage('detect'):
+        detections = face_backend.detect(image)
+    if not detections:
+        return None
+    x, y, right, bottom = detections[0].box
+    return image[y:bottom, x:right], detections[0], face_backend.color_order
+
+
+def _analyze_mean_color(contents, filename):
+    face = _detect_face(contents)
+    if face is None:
+        return None
+    face_region, _, color_order = face
+
+    # Calculate average color
+    avg_color = np.mean(face_region, axis=(0, 1))
+    r, g, b = avg_color if color_order == 'RGB' else avg_color[::-1]
+
+    # Simple season determination
+    warmth = (r - b) / 255.0
+    brightness = (r + g + b) / (3 * 255.0)
+
+    if warmth > 0.1 and brightness > 0.6:
+        season = 'spring'
+    elif warmth <= 0.1 and brightness > 0.6:
+        season = 'summer'
+    elif warmth > 0.1 and brightness <= 0.6:
+        season = 'autumn'
+    else:
+        season = 'winter'
+    return {
+        'season': season,
+        'confidence': None,
+        'debug': {
+            'detected_season': season,
+            'face_detected': True,
+            'method': HEURISTIC_FACE_BACKEND
+        }
+    }
+
+
+def _analyze_hsv(contents, filename):
+    import cv2
+    face = _detect_face(contents)
+    if face is None:
+        return None
+    face_region, detection, color_order = face
+    rgb = color_order == 'RGB'
+
+    # Convert to HSV for better color analysis
+    hsv_face = cv2.cvtColor(face_region, cv2.COLOR_RGB2HSV if rgb else cv2.COLOR_BGR2HSV)
+    avg_h, avg_s, avg_v = np.mean(hsv_face, axis=(0, 1))
+
+    # Also get RGB values
+    avg_color = np.mean(face_region, axis=(0, 1))
+    avg_r, avg_g, avg_b = avg_color if rgb else avg_color[::-1]
+
+    # Determine season based on color analysis
+    warmth = (avg_r - avg_b) / 255.0
+    brightness = avg_v / 255.0
+    saturation = avg_s / 255.0
+
+    if warmth > 0.15 and brightness > 0.65 and saturation > 0.3:
+        season = 'spring'  # Bright and warm
+    elif warmth <= 0.05 and brightness > 0.6 and saturation < 0.4:
+        season = 'summer'  # Cool and soft
+    elif warmth > 0.1 and brightness < 0.65 and saturation > 0.35:
+        season = 'autumn'    # Warm and deep
+    else:
+        season = 'winter'  # Cool and clear
+
+    # Confidence based on the detection confidence, when the detector's score is a
+    # probability (dlib / Haar scores are unbounded, format_result() uses the default)
+    confidence = None
+    if _heuristic_backend().probability_score:
+        confidence = round(min(95.0, 70.0 + (detection.score * 25.0)), 1)
+    return {
+        'season': season,
+        'confidence': confidence,
+        'debug': {
+            'detected_season': season,
+            'face_detected': True,
+            'detection_confidence': float(detection.score),
+            'color_values': {
+                'warmth': round(float(warmth), 3),
+                'brightness': round(float(brightness), 3),
+                'saturation': round(float(saturation), 3),
+                'hsv': {'h': round(float(avg_h), 1), 's': round(float(avg_s), 1), 'v': round(float(avg_v), 1)},
+                'rgb': {'r': round(float(avg_r), 1), 'g': round(float(avg_g), 1), 'b': round(float(avg_b), 1)}
+            }
+        }
+    }
+
+
+# Thread-safe tracking of last result to prevent consecutive duplicates
+_last_random_season = None
+_random_lock = threading.Lock()
+
+
+def _analyze_random(contents, filename):
+    global _last_random_season
+    # only check that the upload is an image, there is no analysis
+    image_decode.image_size(contents)
+    with _random_lock:
+        available = [s for s in recommendations.SEASONS if s != _last_random_season]
+        season = random.choice(available)
+        _last_random_season = season
+    print(f"[DEBUG] Random season selected: {season}")
+    return {
+        'season': season,
+        'confidence': round(random.uniform(75.0, 95.0), 1),
+        'debug': {
+            'mode': 'RANDOM_MODE',
+            'detected_season': season,
+            'note': 'Analysis logic is temporarily disabled. Using 100% random selection.'
+        }
+    }
+
+
+ENGINES = {
+    engine.name: engine
+    for engine in [
+        Engine('dlib', _analyze_dlib, load=_load_dlib, version=_dlib_version),
+        Engine('mediapipe', _analyze_mean_color, load=_heuristic_backend,
+               version=lambda: '1-{}'.format(HEURISTIC_FACE_BACKEND)),
+        Engine('standalone', _analyze_hsv, load=_heuristic_backend,
+               version=lambda: '1-{}'.format(HEURISTIC_FACE_BACKEND)),
+        Engine('random', _analyze_random, cacheable=False, inline=True),
+    ]
+}
+
+
+def get_engine(name):
+    if name not in ENGINES:
+        raise ValueError("Unknown engine: {} (available: {})".format(name, ', '.join(ENGINES)))
+    return ENGINES[name]
+
+
+def enabled_engines(default=None, names=None):
+    """Engines a deployment serves: the default engine first, then ANALYSIS_ENGINES"""
+    default = default or ANALYSIS_ENGINE
+    names = ANALYSIS_ENGINES if names is None else names
+    enabled = [default] + [name for name in names if name != default]
+    for name in enabled:
+        get_engine(name)
+    return enabled
+
+
+# per process: engine name -> load stats, filled by load_engine()
+_loaded = {}
+_load_lock = threading.Lock()
+
+
+def warmup_contents():
+    """Encoded warm-up image, a plain synthetic frame if WARMUP_IMAGE is missing"""
+    try:
+        with open(WARMUP_IMAGE, 'rb') as f:
+            return f.read()
+    except OSError:
+        import cv2
+        # no face to find, but decoding and the detector still run once
+        return cv2.imencode('.jpg', np.full((480, 360, 3), 180, np.uint8))[1].tobytes()
+
+
+def warm_up(name):
+    """Run an engine once on the warm-up image, return the seconds it took"""
+    start = time.perf_counter()
+    try:
+        get_engine(name).analyze(warmup_contents(), 'warm-up')
+    except Exception as e:
+        # a failed warm-up must not take the worker down, requests will report the error
+        print("Warm-up of {} failed: {}".format(name, e))
+    return round(time.perf_counter() - start, 4)
+
+
+def model_stats():
+    """Models loaded in this process with their load time and memory (run in each worker for GET /models)"""
+    return {'pid': os.getpid(), 'rss_bytes': model_registry.rss_bytes(), 'models': model_registry.registry.stats()}
+
+
+def load_engine(name, warm=False):
+    """
+    Load an engine in this process once, return its load time and memory
+    warm: also run the warm-up analysis once (its time is added as warm_up_s)
+    """
+    if name not in _loaded:
+        with _load_lock:
+            if name not in _loaded:
+                engine = get_engine(name)
+                rss_before = model_registry.rss_bytes()
+                start = time.perf_counter()
+                if engine.load is not None:
+                    engine.load()
+                _loaded[name] = {
+                    'load_time_s': round(time.perf_counter() - start, 4),
+                    'rss_delta_bytes': max(0, model_registry.rss_bytes() - rss_before),
+                    'pid': os.getpid()
+                }
+    load = _loaded[name]
+    if warm and 'warm_up_s' not in load:
+        with _load_lock:
+            if 'warm_up_s' not in load:
+                load['warm_up_s'] = warm_up(name)
+    return load
+
+
+def preload(names, warm=WARMUP):
+    """Pool initializer: load (and warm up) the engines a worker will serve"""
+    for name in names:
+        load_engine(name, warm)
+
+
+def run_engine(name, contents, filename=None, profile=False):
+    """
+    Run an engine on an upload (in a pool worker).
+    profile: profile the analysis and write it to profiling.PROFILE_DIR
+    return : (engine result, {'latency_s', 'stages', 'values', 'memory', 'rss_bytes', 'load', 'profile'})
+    of this call, stages is the timing.record() breakdown {stage: seconds} including 'total',
+    values what the pipeline timing.annotate()d (e.g. decoded_pixels), memory the
+    memory.track() peak / RSS delta and profile the id of the written profile (None if not profiled)
+    """
+    load = load_engine(name)
+    engine = get_engine(name)
+    profiler = profiling.Profiler() if profile else contextlib.nullcontext()
+    # inline engines run in the API process, which is not slowed down by tracemalloc
+    tracking = memory.track(peak=memory.TRACEMALLOC and not engine.inline)
+    start = time.perf_counter()
+    with timing.record() as stages, tracking as usage, profiler:
+        result = engine.analyze(contents, filename)
+        values = timing.annotations()
+    latency = time.perf_counter() - start
+    if timing.ENABLED:
+        stages['total'] = latency
+    measurement = {
+        'latency_s': latency,
+        'stages': stages,
+        'values': values,
+        'memory': usage,
+        'rss_bytes': model_registry.rss_bytes(),
+        'load': load,
+        'profile': None
+    }
+    if profile:
+        measurement['profile'] = profiler.save(name, contents, measurement)
+    return result, measurement
+
+
+class EngineStats:
+    """
+    Per engine request count, latency percentiles, load time and worker
+    memory, fed with the measurements run_engine() returns.
+    Only used from the event loop, so there is no lock.
+    """
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self._engines = {}
+
+    def _entry(self, name):
+        if name not in self._engines:
+            self._engines[name] = {
+                'requests': 0, 'errors': 0, 'latencies': deque(maxlen=self.window),
+                'loads': {}, 'peak_rss_bytes': 0, 'peak_analysis_bytes': 0
+            }
+        return self._engines[name]
+
+    def record(self, name, measurement):
+        entry = self._entry(name)
+        entry['requests'] += 1
+        entry['latencies'].append(measurement['latency_s'])
+        load = measurement['load']
+        # one load per worker process, keyed by pid
+        entry['loads'][load['pid']] = load
+        entry['peak_rss_bytes'] = max(entry['peak_rss_bytes'], measurement['rss_bytes'])
+        # largest memory.track() peak of one analysis
+        entry['peak_analysis_bytes'] = max(entry['peak_analysis_bytes'], measurement['memory'].get('peak_bytes', 0))
+
+    def record_error(self, name):
+        self._entry(name)['errors'] += 1
+
+    def stats(self, names):
+        stats = {}
+        for name in names:
+            entry = self._entry(name)
+            latencies = np.array(entry['latencies'])
+            loads = list(entry['loads'].values())
+            stats[name] = {
+                'requests': entry['requests'],
+                'errors': entry['errors'],
+                'latency_ms': {
+                    'mean': round(float(latencies.mean()) * 1000, 2),
+                    'p50': round(float(np.percentile(latencies, 50)) * 1000, 2),
+                    'p95': round(float(np.percentile(latencies, 95)) * 1000, 2),
+                } if len(latencies) else None,
+                'load_time_s': max(load['load_time_s'] for load in loads) if loads else None,
+                'load_rss_delta_bytes': max(load['rss_delta_bytes'] for load in loads) if loads else None,
+                'warm_up_s': max((load.get('warm_up_s', 0) for load in loads), default=0) or None,
+                'workers_loaded': len(loads),
+                'peak_rss_bytes': entry['peak_rss_bytes'] or None,
+                'peak_analysis_bytes': entry['peak_analysis_bytes'] or None,
+                'inline': get_engine(name).inline
+            }
+        return stats
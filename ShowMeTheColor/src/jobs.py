@@ -0,0 +1,191 @@
+"""
+In-process job queue for asynchronous analysis.
+
+POST /jobs stores the upload as a job and returns its id at once; a fixed
+number of worker coroutines take jobs from a bounded asyncio queue and
+await the analysis (which itself runs in the analysis pool), so no request
+waits for compute. Clients read the result with GET /jobs/{id}, optionally
+long-polling until the job is done or following its status as server-sent
+events. Jobs live in this process only: with several instances behind a
+load balancer, polls must reach the instance that accepted the job.
+
+Environment:
+    JOBS_WORKERS      jobs analysed at once (default: ADMISSION_CONCURRENCY)
+    JOBS_MAX_PENDING  queued jobs before POST /jobs answers 503 (default 64)
+    JOBS_TTL          seconds a finished job stays readable (default 3600)
+    JOBS_MAX_WAIT     longest long-poll / event stream wait in seconds (default 30)
+"""
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+
+import admission
+
+JOBS_WORKERS = int(os.environ.get('JOBS_WORKERS', admission.ADMISSION_CONCURRENCY))
+JOBS_MAX_PENDING = int(os.environ.get('JOBS_MAX_PENDING', 64))
+JOBS_TTL = float(os.environ.get('JOBS_TTL', 3600))
+JOBS_MAX_WAIT = float(os.environ.get('JOBS_MAX_WAIT', 30))
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+FINISHED = (DONE, FAILED)
+
+
+class JobFailed(Exception):
+    """Raised by the job function for an expected failure (reported with its HTTP status)"""
+
+    def __init__(self, status, detail):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+class QueueFull(Exception):
+    pass
+
+
+class JobQueue:
+    """
+    run(*args) is the async job function; its return value is the job result.
+    on_finished(job) is called with the public view of every finished job.
+    Only used from the event loop.
+    """
+
+    def __init__(self, run, workers=JOBS_WORKERS, max_pending=JOBS_MAX_PENDING, ttl=JOBS_TTL, on_finished=None):
+        self.run = run
+        self.on_finished = on_finished
+        self.workers = workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._jobs = OrderedDict()
+        self._queue = None
+        self._tasks = []
+        self._stats = {'submitted': 0, 'rejected': 0, 'done': 0, 'failed': 0, 'expired': 0}
+
+    def start(self):
+        # created here so the queue belongs to the running event loop
+        self._queue = asyncio.Queue(self.max_pending)
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        return self
+
+    async def shutdown(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def submit(self, *args):
+        """Queue a job, raises QueueFull when max_pending jobs are waiting"""
+        self._prune()
+        job = {
+            'id': uuid.uuid4().hex,
+            'status': QUEUED,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'result': None,
+            'error': None,
+            'args': args,
+            'changed': asyncio.Event()
+        }
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            self._stats['rejected'] += 1
+            raise QueueFull("{} jobs are already waiting".format(self.max_pending))
+        self._jobs[job['id']] = job
+        self._stats['submitted'] += 1
+        return public(job)
+
+    def get(self, job_id):
+        """Public view of a job, None if it is unknown or expired"""
+        job = self._jobs.get(job_id)
+        return None if job is None else public(job)
+
+    async def wait(self, job_id, timeout):
+        """Wait until the job is finished or timeout seconds have passed, return its public view"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        deadline = time.monotonic() + min(timeout, JOBS_MAX_WAIT)
+        while job['status'] not in FINISHED:
+            if not await self._changed(job, deadline):
+                break
+        return public(job)
+
+    async def events(self, job_id):
+        """Public views of the job on every status change, until it is finished or JOBS_MAX_WAIT passed"""
+        job = self._jobs[job_id]
+        deadline = time.monotonic() + JOBS_MAX_WAIT
+        yield public(job)
+        while job['status'] not in FINISHED:
+            if not await self._changed(job, deadline):
+                return
+            yield public(job)
+
+    @staticmethod
+    async def _changed(job, deadline):
+        try:
+            await asyncio.wait_for(job['changed'].wait(), max(0, deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def _set_status(self, job, status):
+        job['status'] = status
+        # wake up the waiters and give the next change a fresh event
+        changed, job['changed'] = job['changed'], asyncio.Event()
+        changed.set()
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            job['started_at'] = time.time()
+            self._set_status(job, RUNNING)
+            try:
+                job['result'] = await self.run(*job['args'])
+                status = DONE
+            except asyncio.CancelledError:
+                raise
+            except JobFailed as e:
+                job['error'] = {'status': e.status, 'detail': e.detail}
+                status = FAILED
+            except Exception as e:
+                job['error'] = {'status': 500, 'detail': "Analysis failed: {}".format(e)}
+                status = FAILED
+            finally:
+                # the upload is not needed any more
+                job['args'] = None
+                self._queue.task_done()
+            job['finished_at'] = time.time()
+            self._stats[status] += 1
+            self._set_status(job, status)
+            if self.on_finished is not None:
+                self.on_finished(public(job))
+
+    def _prune(self):
+        # jobs are kept in submission order, drop finished ones past their TTL
+        now = time.time()
+        for job_id, job in list(self._jobs.items()):
+            if job['status'] in FINISHED and job['finished_at'] + self.ttl <= now:
+                del self._jobs[job_id]
+                self._stats['expired'] += 1
+
+    def stats(self):
+        counts = {QUEUED: 0, RUNNING: 0}
+        for job in self._jobs.values():
+            if job['status'] in counts:
+                counts[job['status']] += 1
+        return dict(self._stats, queued=counts[QUEUED], running=counts[RUNNING], stored=len(self._jobs),
+                    workers=self.workers, max_pending=self.max_pending, ttl_s=self.ttl)
+
+
+def public(job):
+    """Job fields returned to clients"""
+    view = {key: job[key] for key in ('id', 'status', 'created_at', 'started_at', 'finished_at')}
+    if job['status'] == DONE:
+        view['result'] = job['result']
+    elif job['status'] == FAILED:
+        view['error'] = job['error']
+    return view
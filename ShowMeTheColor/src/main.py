@@ -1,7 +1,11 @@
 from personal_color_analysis import personal_color
+from personal_color_analysis import face_backends
 import argparse
 import os
 
+# --dir 에서 한 번에 묶어서 분석할 이미지 수 (얼굴 영역 k-means를 batch로 계산)
+BATCH_SIZE = 32
+
 
 def main():
     # 인자값 받을 인스턴스 생성
@@ -14,6 +18,9 @@ def main():
     # 입력받은 인자값을 args에 저장
     args = parser.parse_args()
 
+    # 모델은 프로세스당 한 번만 로드해서 모든 이미지 분석에 공유
+    face_backends.preload()
+
     ##################################
     #         a single image         #
     ##################################
@@ -26,10 +33,9 @@ def main():
     ##################################
     elif args.dir != None:
         dirpath = args.dir
-        imgs = os.listdir(dirpath)
-        for imgpath in imgs:
-            #print(os.path.join(dirpath, imgpath))
-            personal_color.analysis(os.path.join(dirpath, imgpath))
+        imgs = [os.path.join(dirpath, imgpath) for imgpath in os.listdir(dirpath)]
+        for i in range(0, len(imgs), BATCH_SIZE):
+            personal_color.analysis_many(imgs[i:i + BATCH_SIZE])
 
 if __name__ == '__main__':
     main()
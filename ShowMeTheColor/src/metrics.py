@@ -0,0 +1,176 @@
+"""
+Prometheus text exposition without the client library.
+
+Counter and Histogram keep their values in this process; Registry.render()
+writes them, plus the values of registered collectors (functions returning
+gauges / counters read from the stats of other components at scrape time),
+in the text format 0.0.4 that Prometheus and compatible agents scrape.
+"""
+import math
+import threading
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(k, _escape(v)) for k, v in labels.items()) + '}'
+
+
+def _format_value(value):
+    if value is None:
+        return 'NaN'
+    value = float(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(value) if value != int(value) else str(int(value))
+
+
+class Metric:
+    """Family of samples of one metric name, keyed by label values"""
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError("{} takes labels {}, got {}".format(self.name, self.labelnames, sorted(labels)))
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, value=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            yield self.name + '_total', dict(zip(self.labelnames, key)), value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, buckets, labelnames=()):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0, 0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += 1
+            entry[2] += value
+
+    def samples(self):
+        with self._lock:
+            items = [(key, (list(counts), count, total)) for key, (counts, count, total) in self._values.items()]
+        for key, (counts, count, total) in items:
+            labels = dict(zip(self.labelnames, key))
+            yield from histogram_samples(self.name, labels, zip(self.buckets, counts), count, total)
+
+
+def histogram_samples(name, labels, buckets, count, total):
+    """Samples of one histogram: cumulative (bound, count) buckets, +Inf, _count and _sum"""
+    for bound, cumulative in buckets:
+        yield name + '_bucket', dict(labels, le=_format_value(bound)), cumulative
+    yield name + '_bucket', dict(labels, le='+Inf'), count
+    yield name + '_count', labels, count
+    yield name + '_sum', labels, total
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, buckets, labelnames=()):
+        return self._register(Histogram(name, help, buckets, labelnames))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def collector(self, fn):
+        """
+        fn() returns a list of (name, type, help, samples) where samples is
+        a list of (labels dict, value); usable as a decorator
+        """
+        self._collectors.append(fn)
+        return fn
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append('# HELP {} {}'.format(metric.name, metric.help))
+            lines.append('# TYPE {} {}'.format(metric.name, metric.type))
+            for name, labels, value in metric.samples():
+                lines.append('{}{} {}'.format(name, _format_labels(labels), _format_value(value)))
+        for collect in self._collectors:
+            for name, type, help, samples in collect():
+                lines.append('# HELP {} {}'.format(name, help))
+                lines.append('# TYPE {} {}'.format(name, type))
+                sample_name = name + '_total' if type == 'counter' else name
+                for sample in samples:
+                    if len(sample) == 3:
+                        # (sample name, labels, value), e.g. histogram buckets
+                        lines.append('{}{} {}'.format(sample[0], _format_labels(sample[1]), _format_value(sample[2])))
+                    else:
+                        labels, value = sample
+                        lines.append('{}{} {}'.format(sample_name, _format_labels(labels), _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upload sizes in bytes and decoded image sizes in pixels
+UPLOAD_BUCKETS = (64 << 10, 256 << 10, 512 << 10, 1 << 20, 2 << 20, 4 << 20, 8 << 20, 16 << 20)
+PIXEL_BUCKETS = (100000, 250000, 500000, 1000000, 2000000, 4000000, 8000000, 16000000)
+# Peak memory of one analysis in bytes
+MEMORY_BUCKETS = (1 << 20, 4 << 20, 16 << 20, 32 << 20, 64 << 20, 128 << 20, 256 << 20, 512 << 20, 1 << 30)
+# RSS growth of one analysis in bytes, usually 0 once a worker is warm
+RSS_DELTA_BUCKETS = (0,) + MEMORY_BUCKETS
+
+# Outcomes of an analysis request, see outcome()
+SUCCESS, NOT_MODIFIED, FACE_NOT_DETECTED = 'success', 'not_modified', 'face_not_detected'
+VALIDATION_ERROR, TOO_LARGE = 'validation_error', 'too_large'
+OVERLOADED, TIMEOUT, ERROR = 'overloaded', 'timeout', 'error'
+
+
+def outcome(status, face_not_detected=False):
+    """Outcome label of an analysis answered with an HTTP status"""
+    if status < 300:
+        return SUCCESS
+    if status == 304:
+        return NOT_MODIFIED
+    if face_not_detected:
+        return FACE_NOT_DETECTED
+    if status == 413:
+        return TOO_LARGE
+    if status < 500:
+        return VALIDATION_ERROR
+    return {503: OVERLOADED, 504: TIMEOUT}.get(status, ERROR)
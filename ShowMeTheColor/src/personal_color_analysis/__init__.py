@@ -0,0 +1,8 @@
+import os
+
+# image_decode.check_size() 다음의 두 번째 방어선: OpenCV도 MAX_SOURCE_PIXELS보다 큰 이미지는
+# 디코딩하지 않음. OpenCV는 이 값을 cv2를 import할 때 한 번만 읽으므로, 어느 모듈이
+# 먼저 cv2를 import하든 그 전에 실행되도록 package를 import할 때 설정 (0이면 상한 없음)
+_max_source_pixels = os.environ.get('DECODE_MAX_SOURCE_PIXELS', '50000000')
+if _max_source_pixels != '0':
+    os.environ.setdefault('OPENCV_IO_MAX_IMAGE_PIXELS', _max_source_pixels)
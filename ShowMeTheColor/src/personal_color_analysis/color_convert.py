@@ -0,0 +1,72 @@
+import numpy as np
+from personal_color_analysis import timing
+
+# colormath(sRGBColor -> LabColor / HSVColor)와 같은 상수를 사용하는 NumPy 색 변환
+# N x 3 배열을 한 번에 변환하고, colormath 결과와의 차이는 1e-9 이하 (float64 연산 오차 수준)
+
+# sRGB (D65) linear RGB -> XYZ, colormath sRGBColor.conversion_matrices['rgb_to_xyz']
+RGB_TO_XYZ = np.array([
+    [0.412424, 0.357579, 0.180464],
+    [0.212656, 0.715158, 0.0721856],
+    [0.0193324, 0.119193, 0.950444]])
+
+# 2도 observer D65 white point
+# RGB에서 변환할 때 colormath는 sRGB의 native illuminant(D65)를 그대로 Lab에 사용 (chromatic adaptation 없음)
+WHITE_D65 = np.array([0.95047, 1.00000, 1.08883])
+
+CIE_E = 216.0 / 24389.0
+
+
+def _as_rgb(rgb):
+    # 0~255 RGB (N, 3) 또는 (3,) -> 0~1 float64 (N, 3)
+    return np.asarray(rgb, dtype=np.float64).reshape(-1, 3) / 255.0
+
+
+def rgb_to_lab(rgb):
+    '''
+    rgb : 0~255 sRGB 값 (N, 3)
+    return : (N, 3) [L, a, b], illuminant D65
+    '''
+    v = _as_rgb(rgb)
+    linear = np.where(v <= 0.04045, v / 12.92, ((v + 0.055) / 1.055) ** 2.4)
+    t = (linear @ RGB_TO_XYZ.T) / WHITE_D65
+    f = np.where(t > CIE_E, np.cbrt(t), 7.787 * t + 16.0 / 116.0)
+    return np.stack([116.0 * f[:, 1] - 16.0,
+                     500.0 * (f[:, 0] - f[:, 1]),
+                     200.0 * (f[:, 1] - f[:, 2])], axis=1)
+
+
+def rgb_to_hsv(rgb):
+    '''
+    rgb : 0~255 sRGB 값 (N, 3)
+    return : (N, 3) [H(0~360), S(0~1), V(0~1)]
+    '''
+    v = _as_rgb(rgb)
+    r, g, b = v[:, 0], v[:, 1], v[:, 2]
+    v_max = v.max(axis=1)
+    v_min = v.min(axis=1)
+    delta = v_max - v_min
+    safe = np.where(delta == 0, 1, delta)
+    h = np.where(v_max == r, (60.0 * (g - b) / safe + 360) % 360.0,
+                 np.where(v_max == g, 60.0 * (b - r) / safe + 120,
+                          60.0 * (r - g) / safe + 240.0))
+    h = np.where(delta == 0, 0.0, h)
+    s = np.where(v_max == 0, 0.0, 1.0 - v_min / np.where(v_max == 0, 1, v_max))
+    return np.stack([h, s, v_max], axis=1)
+
+
+@timing.stage('color_convert')
+def lab_b_hsv_s(rgb):
+    '''
+    personal color 분석에 쓰는 특징값
+    rgb : 0~255 sRGB 값 (N, 3)
+    return : Lab b (N,), HSV s x 100 (N,), 둘 다 소수점 2자리로 반올림
+    '''
+    rgb = np.asarray(rgb, dtype=np.float64).reshape(-1, 3)
+    return _round2(rgb_to_lab(rgb)[:, 2]), _round2(rgb_to_hsv(rgb)[:, 1]) * 100
+
+
+def _round2(values):
+    # float(format(v, ".2f"))와 같은 결과: round()는 10진 반올림을 정확히 하지만
+    # np.round(v, 2)는 v * 100에서 생기는 오차 때문에 경계값에서 결과가 다를 수 있음
+    return np.array([round(v, 2) for v in values.tolist()])
@@ -1,10 +1,9 @@
 import cv2
 import numpy as np
-from sklearn.cluster import KMeans
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 from skimage import io
-from itertools import compress
+from personal_color_analysis import kmeans, timing
 
 class DominantColors:
 
@@ -12,41 +11,49 @@ class DominantColors:
     IMAGE = None
     COLORS = None
     LABELS = None
+    COUNTS = None
 
-    def __init__(self, image, clusters=3):
+    # 'auto' 모드에서 이 픽셀 수보다 큰 영역은 histogram 모드로 clustering
+    HIST_MIN_PIXELS = 4096
+
+    @timing.stage('dominant_colors')
+    def __init__(self, image, clusters=3, engine='numpy', seed=kmeans.SEED,
+                 mode='auto', bin_size=kmeans.HIST_BIN_SIZE):
+        '''
+        image: BGR 이미지 (H, W, 3) 또는 영역 픽셀만 모은 (N, 3) BGR 배열
+        engine: 'numpy' (float32 k-means, seed로 결과 고정) 또는 'sklearn' (기존 KMeans)
+        mode: numpy engine에서 'full' (모든 픽셀), 'histogram' (3D color histogram bin에 대해
+              가중 k-means, bin 한 변은 bin_size 이하) 또는 'auto' (큰 영역만 histogram)
+        '''
         self.CLUSTERS = clusters
-        img = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-        self.IMAGE = img.reshape((img.shape[0] * img.shape[1], 3))
+        pixels = np.asarray(image).reshape(-1, 1, 3)
+        self.IMAGE = cv2.cvtColor(pixels, cv2.COLOR_BGR2RGB).reshape(-1, 3)
 
         #using k-means to cluster pixels
-        kmeans = KMeans(n_clusters = self.CLUSTERS)
-        kmeans.fit(self.IMAGE)
-
         #the cluster centers are our dominant colors.
-        self.COLORS = kmeans.cluster_centers_
-        self.LABELS = kmeans.labels_
+        if mode == 'auto':
+            mode = 'histogram' if len(self.IMAGE) > self.HIST_MIN_PIXELS else 'full'
+        if engine == 'numpy' and mode == 'histogram':
+            self.COLORS, self.LABELS, self.COUNTS = kmeans.histogram_kmeans(
+                self.IMAGE, self.CLUSTERS, bin_size=bin_size, seed=seed)
+        elif engine == 'numpy':
+            self.COLORS, self.LABELS, self.COUNTS = kmeans.kmeans(self.IMAGE, self.CLUSTERS, seed=seed)
+        elif engine == 'sklearn':
+            from sklearn.cluster import KMeans
+            km = KMeans(n_clusters = self.CLUSTERS)
+            km.fit(self.IMAGE)
+            self.COLORS = km.cluster_centers_
+            self.LABELS = km.labels_
+            self.COUNTS = np.bincount(self.LABELS, minlength=self.CLUSTERS)
+        else:
+            raise ValueError("Unknown k-means engine: {}".format(engine))
 
     def rgb_to_hex(self, rgb):
         return '#%02x%02x%02x' % (int(rgb[0]), int(rgb[1]), int(rgb[2]))
 
     # Return a list in order of color that appeared most often.
     def getHistogram(self):
-        numLabels = np.arange(0, self.CLUSTERS+1)
-        #create frequency count tables
-        (hist, _) = np.histogram(self.LABELS, bins = numLabels)
-        hist = hist.astype("float")
-        hist /= hist.sum()
-
-        colors = self.COLORS
-        #descending order sorting as per frequency count
-        colors = colors[(-hist).argsort()]
-        hist = hist[(-hist).argsort()]
-        for i in range(self.CLUSTERS):
-            colors[i] = colors[i].astype(int)
-        # Blue mask 제거
-        fil = [colors[i][2] < 250 and colors[i][0] > 10 for i in range(self.CLUSTERS)]
-        colors = list(compress(colors, fil))
-        return colors, hist
+        return sort_by_frequency(self.COLORS, self.COUNTS)
 
     def plotHistogram(self):
         colors, hist = self.getHistogram()
@@ -69,3 +76,63 @@ class DominantColors:
         plt.show()
 
         return colors
+
+
+def sort_by_frequency(colors, counts):
+    '''
+    cluster 색을 많이 나온 순서로 정렬
+    return : 정수로 자른 RGB 색의 list, 각 색의 비율 (합이 1)
+    '''
+    #frequency count table of each cluster
+    hist = np.asarray(counts, dtype="float")
+    hist /= hist.sum()
+
+    #descending order sorting as per frequency count
+    order = (-hist).argsort()
+    colors = np.asarray(colors)[order]
+    hist = hist[order]
+    for i in range(len(colors)):
+        colors[i] = colors[i].astype(int)
+    return list(colors), hist
+
+
+# batch_dominant_colors()에서 한 번의 k-means로 묶는 최대 픽셀 수
+BATCH_PIXELS = 1 << 16
+
+
+@timing.stage('dominant_colors')
+def batch_dominant_colors(regions, clusters=3, seed=kmeans.SEED, mode='auto',
+                          bin_size=kmeans.HIST_BIN_SIZE):
+    '''
+    여러 영역(한 얼굴의 6개 부위, 여러 이미지의 부위 전체)의 dominant color를 한 번에 계산
+    regions: BGR 영역 픽셀 배열의 list (각각 (N, 3) 또는 (H, W, 3))
+    mode: DominantColors의 numpy engine과 같음 ('auto'는 영역마다 full / histogram 선택)
+    return : 영역마다 DominantColors.getHistogram()과 같은 (colors, hist)의 list
+    '''
+    # BGR -> RGB
+    pixels = [np.asarray(r, dtype=np.uint8).reshape(-1, 3)[:, ::-1] for r in regions]
+    if mode == 'auto':
+        use_hist = [len(p) > DominantColors.HIST_MIN_PIXELS for p in pixels]
+    else:
+        use_hist = [mode == 'histogram'] * len(pixels)
+
+    # 한 번에 clustering하는 픽셀 수를 BATCH_PIXELS 정도로 묶어서 작업 메모리를 cache 크기로 유지
+    results = [None] * len(pixels)
+    for hist_mode in (False, True):
+        members = [i for i, h in enumerate(use_hist) if h == hist_mode]
+        while members:
+            total, n = 0, 0
+            while n < len(members) and (n == 0 or total + len(pixels[members[n]]) <= BATCH_PIXELS):
+                total += len(pixels[members[n]])
+                n += 1
+            chunk, members = members[:n], members[n:]
+            x = np.concatenate([pixels[i] for i in chunk])
+            region_ids = np.repeat(np.arange(len(chunk)), [len(pixels[i]) for i in chunk])
+            if hist_mode:
+                centers, _, counts = kmeans.batch_histogram_kmeans(
+                    x, region_ids, len(chunk), clusters, bin_size=bin_size, seed=seed)
+            else:
+                centers, _, counts = kmeans.batch_kmeans(x, region_ids, len(chunk), clusters, seed=seed)
+            for j, i in enumerate(chunk):
+                results[i] = sort_by_frequency(centers[j], counts[j])
+    return results
@@ -2,30 +2,71 @@
 # import the necessary packages
 from imutils import face_utils
 import numpy as np
-import dlib
 import cv2
 import matplotlib.pyplot as plt
+from collections import namedtuple
+from personal_color_analysis import face_backends, image_decode, timing
+
+# A face region as an index into the original image: the top-left corner of
+# its bounding box and a boolean mask of the in-region pixels inside that box
+FaceRegion = namedtuple('FaceRegion', ['x', 'y', 'mask'])
+
+# analysis order of the face regions
+REGION_NAMES = ['left_cheek', 'right_cheek',
+                'left_eyebrow', 'right_eyebrow',
+                'left_eye', 'right_eye']
+
+def load_image(image):
+    '''
+    image: 파일 경로(str), 인코딩된 이미지 바이트(bytes, bytearray, memoryview)
+    또는 이미 디코딩된 np.ndarray (BGR)
+    return type : BGR np.ndarray
+    '''
+    if isinstance(image, np.ndarray):
+        if image.ndim == 2:
+            return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+        if image.shape[2] == 4:
+            return cv2.cvtColor(image, cv2.COLOR_BGRA2BGR)
+        return image
+    if not isinstance(image, (bytes, bytearray, memoryview)):
+        try:
+            with open(image, 'rb') as f:
+                image = f.read()
+        except OSError:
+            raise ValueError("Could not decode the image")
+    # decode once, straight from the in-memory buffer: JPEG DCT downscaling,
+    # EXIF orientation and the image_decode.MAX_PIXELS cap
+    return image_decode.decode(image)
+
 
 class DetectFace:
-    def __init__(self, image):
-        # initialize dlib's face detector (HOG-based)
-        # and then create the facial landmark predictor
-        self.detector = dlib.get_frontal_face_detector()
-        import os
-        # Get the correct path to the landmarks file
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        landmarks_path = os.path.join(current_dir, '..', '..', 'res', 'shape_predictor_68_face_landmarks.dat')
-        if not os.path.exists(landmarks_path):
-            # Try alternative path for Docker
-            landmarks_path = '/app/res/shape_predictor_68_face_landmarks.dat'
-        self.predictor = dlib.shape_predictor(landmarks_path)
+    # 얼굴 검출은 긴 변이 DETECT_MAX_SIDE 이하로 축소한 이미지에서 수행
+    # (None이면 원본 해상도에서 upsample=1로 검출하는 기존 방식)
+    DETECT_MAX_SIDE = 800
+    # HOG 검출기는 약 80px 이상의 얼굴만 찾기 때문에, upsample=0에서 못 찾으면
+    # 이미지 크기로 정한 upsample 단계에서 한 번만 다시 찾는다. 단계마다 검출 시간이
+    # 약 4배씩 늘어나므로 (800px 이미지의 upsample=2는 upsample=0의 약 21배),
+    # upsample한 긴 변이 RETRY_MAX_SIDE 이하인 가장 큰 단계를 사용
+    # (긴 변 800px -> 1 (40px 얼굴까지), 400px 이하 -> 2)
+    RETRY_MAX_SIDE = 2 * DETECT_MAX_SIDE
+
+    def __init__(self, image, detect_max_side=DETECT_MAX_SIDE, backend=None):
+        # face detector backend (dlib HOG by default, see face_backends).
+        # Models are loaded once per process and shared through the model registry
+        self.backend = face_backends.get_backend(backend)
 
         #face detection part
-        self.img = cv2.imread(image)
-        #if self.img.shape[0]>500:
-        #    self.img = cv2.resize(self.img, dsize=(0,0), fx=0.8, fy=0.8)
+        self.img = load_image(image)
+        self.detect_max_side = detect_max_side
+        # detection image scale (detection coords = full-res coords * scale)
+        self.scale = 1.0
+        self.upsample = 1
+        self.face_rect = None
+        self.landmarks = None
+        self.score = None
 
-        # init face parts
+        # init face parts (regions + gathered (N, 3) BGR pixels of each region)
+        self.regions = {}
         self.right_eyebrow = []
         self.left_eyebrow = []
         self.right_eye = []
@@ -37,49 +78,103 @@ class DetectFace:
         self.detect_face_part()
 
 
+    def detection_image(self):
+        '''
+        검출에 사용할 컬러/grayscale 이미지와 원본 대비 축소 비율을 반환
+        컬러 이미지를 먼저 축소한 뒤 grayscale로 변환하므로 변환은 한 번만 일어남
+        '''
+        h, w = self.img.shape[:2]
+        if self.detect_max_side is None or max(h, w) <= self.detect_max_side:
+            return self.img, cv2.cvtColor(self.img, cv2.COLOR_BGR2GRAY), 1.0
+        scale = self.detect_max_side / float(max(h, w))
+        small = cv2.resize(self.img, (max(1, int(round(w * scale))), max(1, int(round(h * scale)))),
+                           interpolation=cv2.INTER_AREA)
+        return small, cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), scale
+
+    def retry_upsample(self, image):
+        '''
+        upsample=0에서 얼굴을 못 찾았을 때 사용할 upsample 단계 (0이면 다시 찾지 않음)
+        '''
+        side = max(image.shape[:2])
+        upsample = min(1, self.backend.max_upsample)
+        while upsample < self.backend.max_upsample and side * 2 ** (upsample + 1) <= self.RETRY_MAX_SIDE:
+            upsample += 1
+        return upsample
+
+    def detect(self, image, gray):
+        '''
+        큰 얼굴은 upsample=0에서 바로 찾고, 못 찾은 경우에만 retry_upsample() 단계로
+        한 번 더 찾음 (얼굴이 없는 이미지도 검출은 최대 두 번)
+        return : (검출된 얼굴 list, 사용한 upsample)
+        '''
+        if self.backend.color_order == 'RGB':
+            image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        if self.detect_max_side is None:
+            upsample = min(1, self.backend.max_upsample)
+            return self.backend.detect(image, gray, upsample), upsample
+        faces = self.backend.detect(image, gray, 0)
+        retry = self.retry_upsample(image)
+        if len(faces) == 0 and retry > 0:
+            return self.backend.detect(image, gray, retry), retry
+        return faces, 0
+
     # return type : np.array
     def detect_face_part(self):
-        face_parts = [[],[],[],[],[],[],[]]
-        # detect faces in the grayscale image
-        faces = self.detector(cv2.cvtColor(self.img, cv2.COLOR_BGR2GRAY), 1)
+        # detect faces in the (size-capped) image
+        with timing.stage('detect'):
+            image, gray, self.scale = self.detection_image()
+            faces, self.upsample = self.detect(image, gray)
         if len(faces) == 0:
             raise Exception("No face detected in the image")
-        rect = faces[0]
-
-        # determine the facial landmarks for the face region, then
-        # convert the landmark (x, y)-coordinates to a NumPy array
-        shape = self.predictor(cv2.cvtColor(self.img, cv2.COLOR_BGR2GRAY), rect)
-        shape = face_utils.shape_to_np(shape)
-
-        idx = 0
-        # loop over the face parts individually
-        for (name, (i, j)) in face_utils.FACIAL_LANDMARKS_IDXS.items():
-            face_parts[idx] = shape[i:j]
-            idx += 1
-        face_parts = face_parts[1:5]
+        face = faces[0]
+
+        # determine the 68 facial landmarks for the face region as a NumPy array.
+        # backends without them (MediaPipe keypoints, OpenCV boxes) are refined
+        # with the dlib shape predictor on the detected box
+        shape = face.landmarks
+        if shape is None or len(shape) != 68:
+            shape = face_backends.predict_landmarks(gray, face.box)
+        if self.scale != 1.0:
+            # map the landmarks back to the full resolution image
+            shape = np.rint(shape / self.scale).astype(int)
+        # keep every region inside the image
+        h, w = self.img.shape[:2]
+        shape[:, 0] = np.clip(shape[:, 0], 0, w - 1)
+        shape[:, 1] = np.clip(shape[:, 1], 0, h - 1)
+        self.face_rect = tuple(int(round(v / self.scale)) for v in face.box)
+        self.landmarks = shape
+        self.score = face.score
+
         # set the variables
-        # Caution: this coordinates fits on the RESIZED image.
-        self.right_eyebrow = self.extract_face_part(face_parts[0])
-        #cv2.imshow("right_eyebrow", self.right_eyebrow)
-        #cv2.waitKey(0)
-        self.left_eyebrow = self.extract_face_part(face_parts[1])
-        self.right_eye = self.extract_face_part(face_parts[2])
-        self.left_eye = self.extract_face_part(face_parts[3])
-        # Cheeks are detected by relative position to the face landmarks
-        self.left_cheek = self.img[shape[29][1]:shape[33][1], shape[4][0]:shape[48][0]]
-        self.right_cheek = self.img[shape[29][1]:shape[33][1], shape[54][0]:shape[12][0]]
-
-    # parameter example : self.right_eye
-    # return type : image
-    def extract_face_part(self, face_part_points):
-        (x, y, w, h) = cv2.boundingRect(face_part_points)
-        crop = self.img[y:y+h, x:x+w]
-        adj_points = np.array([np.array([p[0]-x, p[1]-y]) for p in face_part_points])
-
-        # Create an mask
-        mask = np.zeros((crop.shape[0], crop.shape[1]))
-        cv2.fillConvexPoly(mask, adj_points, 1)
-        mask = mask.astype(np.bool)
-        crop[np.logical_not(mask)] = [255, 0, 0]
-
-        return crop
+        # coordinates are in full resolution image space
+        with timing.stage('face_regions'):
+            for name in ['right_eyebrow', 'left_eyebrow', 'right_eye', 'left_eye']:
+                (i, j) = face_utils.FACIAL_LANDMARKS_IDXS[name]
+                self.regions[name] = self.polygon_region(shape[i:j])
+            # Cheeks are detected by relative position to the face landmarks
+            self.regions['left_cheek'] = self.rect_region(shape[4][0], shape[29][1], shape[48][0], shape[33][1])
+            self.regions['right_cheek'] = self.rect_region(shape[54][0], shape[29][1], shape[12][0], shape[33][1])
+
+            for name in REGION_NAMES:
+                setattr(self, name, self.region_pixels(self.regions[name]))
+
+    # parameter example : right eye landmark points
+    # return type : FaceRegion
+    def polygon_region(self, face_part_points):
+        points = np.asarray(face_part_points, dtype=np.int32)
+        (x, y, w, h) = cv2.boundingRect(points)
+        # Create a mask of the polygon inside its bounding box
+        mask = np.zeros((h, w), dtype=np.uint8)
+        cv2.fillConvexPoly(mask, points - (x, y), 1)
+        return FaceRegion(x, y, mask.view(bool))
+
+    def rect_region(self, left, top, right, bottom):
+        h, w = max(0, bottom - top), max(0, right - left)
+        return FaceRegion(left, top, np.ones((h, w), dtype=bool))
+
+    # return type : (N, 3) BGR np.array holding only the in-region pixels
+    def region_pixels(self, region):
+        h, w = region.mask.shape
+        # boolean indexing gathers the selected pixels into one contiguous
+        # array and never writes to self.img
+        return self.img[region.y:region.y + h, region.x:region.x + w][region.mask]
@@ -0,0 +1,204 @@
+import os
+from collections import namedtuple
+
+import cv2
+import numpy as np
+from personal_color_analysis import model_registry, timing
+
+# box : (left, top, right, bottom) in pixels of the image passed to detect()
+# landmarks : (N, 2) int np.array in the same coordinates, or None
+# score : detector confidence (scale depends on the backend)
+FaceDetection = namedtuple('FaceDetection', ['box', 'landmarks', 'score'])
+
+# 사용할 backend는 FACE_BACKEND 환경변수로 선택 (dlib, mediapipe, opencv-dnn, opencv-haar)
+DEFAULT_BACKEND = os.environ.get('FACE_BACKEND', 'dlib')
+
+_RES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', 'res')
+
+
+class FaceBackend:
+    '''
+    얼굴 검출 backend 공통 인터페이스
+    detect()는 검출된 얼굴을 score가 높은 순서로 FaceDetection 리스트로 반환
+    '''
+    name = None
+    # 작은 얼굴을 찾기 위해 지원하는 최대 upsample 단계 (0이면 지원 안 함)
+    max_upsample = 0
+    # detect()가 받는 image의 채널 순서 ('BGR' 또는 'RGB'), image_decode.decode(layout=)에 그대로 사용
+    color_order = 'BGR'
+    # FaceDetection.score가 0~1 확률인지 (dlib HOG, Haar는 크기가 정해지지 않은 점수)
+    probability_score = False
+
+    def detect(self, image, gray=None, upsample=0):
+        '''
+        image : color_order 순서의 np.array
+        gray : image의 grayscale 버전 (이미 있으면 넘겨서 재변환을 피함)
+        upsample : 이미지를 2^upsample배 키운 것처럼 작은 얼굴까지 검출
+        '''
+        raise NotImplementedError
+
+
+class DlibHOGBackend(FaceBackend):
+    name = 'dlib'
+    max_upsample = 2
+
+    def __init__(self):
+        self.detector = model_registry.get_face_detector()
+        self.predictor = model_registry.get_shape_predictor()
+
+    def detect(self, image, gray=None, upsample=0):
+        from imutils import face_utils
+        if gray is None:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        rects, scores, _ = self.detector.run(gray, upsample)
+        order = sorted(range(len(rects)), key=lambda i: -scores[i])
+        detections = [FaceDetection((rects[i].left(), rects[i].top(), rects[i].right(), rects[i].bottom()),
+                                    None, float(scores[i])) for i in order]
+        if detections:
+            # 분석에는 score가 가장 높은 얼굴만 쓰므로 68개 landmark도 그 얼굴만 계산
+            # (나머지 얼굴의 landmarks는 None)
+            with timing.stage('landmarks'):
+                shape = face_utils.shape_to_np(self.predictor(gray, rects[order[0]]))
+            detections[0] = detections[0]._replace(landmarks=shape)
+        return detections
+
+
+class MediaPipeBackend(FaceBackend):
+    '''
+    MediaPipe BlazeFace. landmarks는 6개 keypoint
+    (right eye, left eye, nose tip, mouth center, right ear tragion, left ear tragion)
+    '''
+    name = 'mediapipe'
+    color_order = 'RGB'
+    probability_score = True
+
+    def __init__(self):
+        self.face_detection = model_registry.registry.get('mediapipe_face_detection')
+
+    def detect(self, image, gray=None, upsample=0):
+        h, w = image.shape[:2]
+        results = self.face_detection.process(image)
+        detections = []
+        for detection in (results.detections or []):
+            data = detection.location_data
+            bbox = data.relative_bounding_box
+            left = max(0, int(bbox.xmin * w))
+            top = max(0, int(bbox.ymin * h))
+            right = min(w, left + int(bbox.width * w))
+            bottom = min(h, top + int(bbox.height * h))
+            keypoints = np.array([[int(p.x * w), int(p.y * h)] for p in data.relative_keypoints])
+            detections.append(FaceDetection((left, top, right, bottom), keypoints, float(detection.score[0])))
+        return sorted(detections, key=lambda d: -d.score)
+
+
+class OpenCVDNNBackend(FaceBackend):
+    '''
+    OpenCV DNN face detector (res10 300x300 SSD, Caffe)
+    모델 파일 경로는 OPENCV_DNN_PROTOTXT, OPENCV_DNN_MODEL 환경변수로 지정 가능
+    '''
+    name = 'opencv-dnn'
+    probability_score = True
+    CONFIDENCE = 0.5
+
+    def __init__(self):
+        self.net = model_registry.registry.get('opencv_dnn_face')
+
+    def detect(self, image, gray=None, upsample=0):
+        h, w = image.shape[:2]
+        blob = cv2.dnn.blobFromImage(cv2.resize(image, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0))
+        self.net.setInput(blob)
+        output = self.net.forward()[0, 0]
+        detections = []
+        for row in output[output[:, 2] >= self.CONFIDENCE]:
+            left, top, right, bottom = (row[3:7] * [w, h, w, h]).astype(int)
+            box = (max(0, left), max(0, top), min(w, right), min(h, bottom))
+            detections.append(FaceDetection(box, None, float(row[2])))
+        return sorted(detections, key=lambda d: -d.score)
+
+
+class OpenCVHaarBackend(FaceBackend):
+    name = 'opencv-haar'
+
+    def __init__(self):
+        self.cascade = model_registry.registry.get('opencv_haar_face')
+
+    def detect(self, image, gray=None, upsample=0):
+        if gray is None:
+            gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+        rects, _, weights = self.cascade.detectMultiScale3(
+            gray, scaleFactor=1.1, minNeighbors=5, minSize=(40, 40), outputRejectLevels=True)
+        detections = [FaceDetection((int(x), int(y), int(x + w), int(y + h)), None, float(weight))
+                      for (x, y, w, h), weight in zip(rects, np.ravel(weights))]
+        return sorted(detections, key=lambda d: -d.score)
+
+
+def _load_mediapipe_face_detection():
+    import mediapipe as mp
+    return mp.solutions.face_detection.FaceDetection(min_detection_confidence=0.5)
+
+
+def _dnn_prototxt_path():
+    return os.environ.get('OPENCV_DNN_PROTOTXT', os.path.join(_RES_DIR, 'deploy.prototxt'))
+
+
+def _dnn_model_path():
+    return os.environ.get('OPENCV_DNN_MODEL', os.path.join(_RES_DIR, 'res10_300x300_ssd_iter_140000.caffemodel'))
+
+
+def _load_opencv_dnn_face():
+    return cv2.dnn.readNetFromCaffe(_dnn_prototxt_path(), _dnn_model_path())
+
+
+def _haar_cascade_path():
+    return os.path.join(cv2.data.haarcascades, 'haarcascade_frontalface_default.xml')
+
+
+def _load_opencv_haar_face():
+    cascade = cv2.CascadeClassifier(_haar_cascade_path())
+    if cascade.empty():
+        raise IOError("Could not load Haar cascade from {}".format(_haar_cascade_path()))
+    return cascade
+
+
+model_registry.registry.register('mediapipe_face_detection', _load_mediapipe_face_detection)
+model_registry.registry.register('opencv_dnn_face', _load_opencv_dnn_face, path=_dnn_model_path)
+model_registry.registry.register('opencv_haar_face', _load_opencv_haar_face, path=_haar_cascade_path)
+
+BACKENDS = {
+    backend.name: backend
+    for backend in [DlibHOGBackend, MediaPipeBackend, OpenCVDNNBackend, OpenCVHaarBackend]
+}
+_instances = {}
+
+
+def get_backend(name=None):
+    '''
+    이름으로 backend 인스턴스를 반환 (프로세스당 하나씩 만들어서 공유)
+    name이 없으면 FACE_BACKEND 환경변수 값(기본 dlib)을 사용
+    '''
+    name = name or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        raise ValueError("Unknown face backend: {} (available: {})".format(name, ', '.join(BACKENDS)))
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
+
+
+def preload(name=None):
+    '''
+    DetectFace에 필요한 모델(검출 backend + 68 landmark predictor)을 미리 로드
+    '''
+    get_backend(name)
+    model_registry.get_shape_predictor()
+    return model_registry.registry.stats()
+
+
+@timing.stage('landmarks')
+def predict_landmarks(gray, box):
+    '''
+    backend가 68개 landmark를 주지 않는 경우, 검출된 box에 dlib shape predictor를 적용
+    '''
+    import dlib
+    from imutils import face_utils
+    rect = dlib.rectangle(*[int(v) for v in box])
+    return face_utils.shape_to_np(model_registry.get_shape_predictor()(gray, rect))
@@ -0,0 +1,114 @@
+import io
+import os
+
+import cv2
+import numpy as np
+from PIL import Image
+from personal_color_analysis import timing
+
+# 디코딩 후 최대 픽셀 수. 얼굴 색 분석에는 얼굴이 수백 px이면 충분하므로
+# 12~48MP 휴대폰 사진은 이 크기 이하로 줄여서 디코딩
+MAX_PIXELS = int(os.environ.get('DECODE_MAX_PIXELS', 2000000))
+
+# 헤더에 적힌 원본 크기의 상한 (decompression bomb 방지). 압축된 PNG 몇 MB가
+# 디코딩하면 수 GB가 될 수 있으므로, 디코딩(메모리 할당) 전에 거절
+# 기본값은 48MP 휴대폰 사진이 들어가는 크기
+MAX_SOURCE_PIXELS = int(os.environ.get('DECODE_MAX_SOURCE_PIXELS', 50000000))
+
+# 디코딩하는 형식 (MPO는 휴대폰 카메라가 저장하는 JPEG). 나머지 형식(HDR, TIFF 등)은
+# 헤더로 크기를 확인할 수 없으므로 OpenCV에 넘기지 않음
+FORMATS = ('JPEG', 'MPO', 'PNG')
+
+
+class UnsupportedImage(ValueError):
+    pass
+
+
+class ImageTooLarge(ValueError):
+    def __init__(self, width, height, max_pixels):
+        if width is None:
+            message = "Image dimensions exceed the limit of {} pixels".format(max_pixels)
+        else:
+            message = "Image dimensions {}x{} exceed the limit of {} pixels".format(width, height, max_pixels)
+        super().__init__(message)
+        self.width = width
+        self.height = height
+        self.max_pixels = max_pixels
+
+# JPEG은 DCT 단계에서 1/2, 1/4, 1/8로 줄여서 디코딩할 수 있음 (전체 해상도 디코딩보다 훨씬 빠름)
+_REDUCED_FLAGS = [(8, cv2.IMREAD_REDUCED_COLOR_8),
+                  (4, cv2.IMREAD_REDUCED_COLOR_4),
+                  (2, cv2.IMREAD_REDUCED_COLOR_2)]
+
+
+def image_size(data):
+    '''
+    헤더만 읽어서 (format, width, height)를 반환 (픽셀은 디코딩하지 않음)
+    '''
+    with Image.open(io.BytesIO(data)) as img:
+        return img.format, img.width, img.height
+
+
+def check_size(data, max_source_pixels=MAX_SOURCE_PIXELS):
+    '''
+    헤더의 크기가 max_source_pixels를 넘으면 ImageTooLarge,
+    PIL이 JPEG / PNG로 읽지 못하면 UnsupportedImage (픽셀은 디코딩하지 않음)
+    return : image_size()의 (format, width, height)
+    '''
+    try:
+        fmt, width, height = image_size(data)
+    except Image.DecompressionBombError:
+        # PIL 자체 상한(MAX_IMAGE_PIXELS의 2배)도 넘는 경우
+        raise ImageTooLarge(None, None, max_source_pixels)
+    except (OSError, ValueError):
+        raise UnsupportedImage("Could not read the image, only JPEG and PNG are supported")
+    if fmt not in FORMATS:
+        raise UnsupportedImage("Unsupported image format {}, only JPEG and PNG are supported".format(fmt))
+    if max_source_pixels and width * height > max_source_pixels:
+        raise ImageTooLarge(width, height, max_source_pixels)
+    return fmt, width, height
+
+
+def reduction_for(width, height, max_pixels=MAX_PIXELS):
+    '''
+    축소 후에도 max_pixels 이상이 남는 가장 큰 JPEG 축소 비율 (1, 2, 4, 8)
+    남은 부분은 decode() 에서 INTER_AREA로 정확히 max_pixels까지 줄임
+    '''
+    for factor, _ in _REDUCED_FLAGS:
+        if (width // factor) * (height // factor) >= max_pixels:
+            return factor
+    return 1
+
+
+@timing.stage('decode')
+def decode(data, max_pixels=MAX_PIXELS, layout='BGR'):
+    '''
+    인코딩된 이미지(bytes, bytearray, memoryview)를 한 번만 디코딩
+    - JPEG은 DCT 축소 디코딩 (IMREAD_REDUCED_COLOR_*)으로 max_pixels 근처까지 줄임
+    - EXIF orientation 적용 (OpenCV imdecode가 IMREAD_IGNORE_ORIENTATION 없이 처리)
+    - max_pixels를 넘으면 INTER_AREA로 축소 (max_pixels가 None이면 원본 크기)
+    - 헤더의 크기가 MAX_SOURCE_PIXELS를 넘으면 디코딩 전에 ImageTooLarge, JPEG / PNG가 아니면 UnsupportedImage
+    layout: 'BGR' (dlib/OpenCV) 또는 'RGB' (MediaPipe), 같은 buffer를 in-place로 변환
+    return : uint8 (H, W, 3) np.ndarray
+    '''
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    flags = cv2.IMREAD_COLOR
+    fmt, width, height = check_size(data)
+    if max_pixels and fmt in ('JPEG', 'MPO'):
+        factor = reduction_for(width, height, max_pixels)
+        flags = dict(_REDUCED_FLAGS).get(factor, cv2.IMREAD_COLOR)
+
+    img = cv2.imdecode(buffer, flags)
+    if img is None:
+        raise ValueError("Could not decode the image")
+
+    h, w = img.shape[:2]
+    if max_pixels and h * w > max_pixels:
+        f = np.sqrt(max_pixels / (h * w))
+        img = cv2.resize(img, (max(1, int(w * f)), max(1, int(h * f))), interpolation=cv2.INTER_AREA)
+    timing.annotate('decoded_pixels', img.shape[0] * img.shape[1])
+    if layout == 'RGB':
+        cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=img)
+    elif layout != 'BGR':
+        raise ValueError("Unknown layout: {}".format(layout))
+    return img
@@ -0,0 +1,258 @@
+import numpy as np
+
+# 기본 설정: 결과가 seed에 의해 결정되므로 같은 입력이면 항상 같은 결과
+MAX_ITER = 20
+TOL = 0.5            # center 이동량(색상값 단위)이 이 값 이하이면 수렴으로 판단
+SEED = 0
+SAMPLE_SIZE = 2048   # seeding과 초기 Lloyd 반복에 사용할 영역당 최대 샘플 수
+REFINE_ITER = 2      # 샘플로 수렴한 뒤 전체 데이터로 반복할 횟수
+HIST_BIN_SIZE = 8    # histogram 모드의 bin 한 변의 최대 길이 (색상값 단위, 결과 오차의 상한은 아님)
+
+# 이보다 bin 수(영역 수 x 영역당 bin 수)가 많으면 bincount 대신 np.unique로 histogram 계산
+_DENSE_HIST_BINS = 1 << 20
+
+# All functions work on a ragged batch: every point carries the id of the
+# region (face part, image, ...) it belongs to and each region is clustered
+# independently. Seeding, center updates and histograms are computed for all
+# regions at once; only the per-region distance matmul loops over regions.
+# Every region draws from its own random stream seeded with the same seed, so a
+# region's result depends only on its own points, not on the batch it is in.
+
+
+def region_rngs(n_regions, seed=SEED):
+    '''
+    영역마다 seed로 시작하는 독립된 random generator
+    '''
+    return [np.random.default_rng(seed) for _ in range(n_regions)]
+
+
+def _choose(p, rngs):
+    '''
+    행마다 p에 비례하는 확률로 index 하나를 선택 (p : (R, S), 합이 0인 행은 0번)
+    rngs : 행마다 하나씩의 random generator
+    '''
+    cum = np.cumsum(p, axis=1)
+    total = cum[:, -1]
+    u = np.array([rng.random() for rng in rngs]) * total
+    idx = (cum <= u[:, None]).sum(axis=1)
+    return np.where(total > 0, np.minimum(idx, p.shape[1] - 1), 0)
+
+
+def batch_kmeans_pp(x, valid, k, rngs, weights=None):
+    '''
+    k-means++ seeding을 모든 영역에 대해 동시에 수행
+    x : (R, S, 3) 영역별 padding된 점, valid : (R, S) 실제 점 여부, rngs : 영역별 random generator
+    이미 뽑힌 center와의 거리 제곱(x weight)에 비례하는 확률로 다음 center 선택
+    '''
+    rows = np.arange(len(x))
+    w = valid.astype(np.float64) if weights is None else weights * valid
+    centers = np.empty((len(x), k, 3), dtype=np.float32)
+    centers[:, 0] = x[rows, _choose(w, rngs)]
+    closest = ((x - centers[:, None, 0]) ** 2).sum(axis=2)
+    for i in range(1, k):
+        # 영역의 모든 점이 이미 center와 같으면(색이 k개보다 적음) 첫 번째 점을 중복 선택
+        centers[:, i] = x[rows, _choose(closest * w, rngs)]
+        np.minimum(closest, ((x - centers[:, None, i]) ** 2).sum(axis=2), out=closest)
+    return centers
+
+
+def _batch_assign(x, bounds, centers, labels=None, active=None):
+    '''
+    x[bounds[r]:bounds[r+1]]의 점들을 영역 r의 가장 가까운 center에 할당
+    active가 주어지면 해당 영역만 다시 계산하고 나머지는 labels 값을 유지
+    '''
+    # argmin_c |x - c|^2 == argmin_c (|c|^2 - 2 x.c), |x|^2 does not change the winner
+    cc = (centers * centers).sum(axis=2)
+    if labels is None:
+        labels = np.empty(len(x), dtype=np.intp)
+    for r in (range(len(centers)) if active is None else np.flatnonzero(active)):
+        start, end = bounds[r], bounds[r + 1]
+        d = x[start:end] @ (-2 * centers[r].T)
+        d += cc[r]
+        labels[start:end] = d.argmin(axis=1)
+    return labels
+
+
+def batch_lloyd(x, region_ids, bounds, centers, weights=None, max_iter=MAX_ITER, tol=TOL):
+    '''
+    Lloyd 반복: 할당 -> center 갱신을 center 이동량이 tol 이하가 될 때까지 (최대 max_iter번)
+    수렴한 영역은 고정하고 나머지 영역만 계속 반복
+    x : (N, 3) 영역 순서로 정렬된 점, region_ids : (N,), bounds : (R+1,) 영역별 시작 위치,
+    centers : (R, k, 3)
+    '''
+    n_regions, k, _ = centers.shape
+    active = np.ones(n_regions, dtype=bool)
+    labels = None
+    for _ in range(max_iter):
+        labels = _batch_assign(x, bounds, centers, labels, active)
+        slots = region_ids * k + labels
+        counts = np.bincount(slots, weights=weights, minlength=n_regions * k)
+        new_centers = centers.reshape(-1, 3).copy()
+        # empty clusters and converged regions keep their previous centers
+        update = (counts > 0) & np.repeat(active, k)
+        for c in range(3):
+            sums = np.bincount(slots, weights=x[:, c] if weights is None else x[:, c] * weights,
+                               minlength=n_regions * k)
+            new_centers[update, c] = sums[update] / counts[update]
+        new_centers = new_centers.reshape(centers.shape)
+        active &= np.abs(new_centers - centers).max(axis=(1, 2)) > tol
+        centers = new_centers
+        if not active.any():
+            break
+    return centers
+
+
+def _segment_sample(bounds, size, rngs, weights=None):
+    '''
+    영역마다 최대 size개 점을 비복원 추출 (weights가 있으면 가중치에 비례, Efraimidis-Spirakis)
+    rngs : 영역별 random generator
+    return : idx (R, size) 원래 점의 index, valid (R, size) 실제 점 여부
+    '''
+    n_regions = len(bounds) - 1
+    idx = np.zeros((n_regions, size), dtype=np.intp)
+    valid = np.zeros((n_regions, size), dtype=bool)
+    for r, rng in enumerate(rngs):
+        start, end = bounds[r], bounds[r + 1]
+        n = end - start
+        if n <= size:
+            idx[r, :n] = np.arange(start, end)
+            valid[r, :n] = True
+            continue
+        if weights is None:
+            picked = rng.choice(n, size, replace=False)
+        else:
+            keys = -np.log(rng.random(n)) / np.maximum(weights[start:end], 1e-12)
+            picked = np.argpartition(keys, size)[:size]
+        idx[r] = start + np.sort(picked)
+        valid[r] = True
+    return idx, valid
+
+
+def batch_kmeans(pixels, region_ids, n_regions, k, weights=None, max_iter=MAX_ITER, tol=TOL,
+                 seed=SEED, sample_size=SAMPLE_SIZE, refine_iter=REFINE_ITER):
+    '''
+    여러 영역을 한 번에 clustering하는 float32 NumPy k-means
+    pixels : (N, 3) 모든 영역의 점을 이어붙인 배열
+    region_ids : (N,) 각 점이 속한 영역 번호 (0 ~ n_regions-1)
+    weights : (N,) 각 점의 가중치 (None이면 모두 1)
+    sample_size보다 큰 영역은 샘플에서 seeding + 수렴시킨 뒤 전체 데이터로 refine_iter번만 반복
+    return : centers (R, k, 3) float32, labels (N,), counts (R, k) 각 cluster의 가중치 합
+    '''
+    x = np.ascontiguousarray(pixels, dtype=np.float32).reshape(-1, 3)
+    region_ids = np.asarray(region_ids, dtype=np.intp)
+    sizes = np.bincount(region_ids, minlength=n_regions)
+    if len(sizes) > n_regions or (sizes == 0).any():
+        raise ValueError("kmeans needs at least one pixel in every region")
+    w = None if weights is None else np.asarray(weights, dtype=np.float64)
+
+    # 영역별로 연속된 구간이 되도록 정렬 (영역 순서로 이어붙인 입력이면 그대로 사용)
+    order = None
+    if (np.diff(region_ids) < 0).any():
+        order = np.argsort(region_ids, kind='stable')
+        x, region_ids = x[order], region_ids[order]
+        w = None if w is None else w[order]
+    bounds = np.concatenate([[0], np.cumsum(sizes)])
+    rngs = region_rngs(n_regions, seed)
+
+    size = int(min(sample_size, sizes.max()))
+    idx, valid = _segment_sample(bounds, size, rngs, w)
+    subsampled = sizes > size
+    # weighted subsampling already accounts for the weights of subsampled regions
+    sample_w = None if w is None else np.where(subsampled[:, None], 1.0, w[idx]) * valid
+    centers = batch_kmeans_pp(x[idx], valid, k, rngs, sample_w)
+
+    sample_sizes = valid.sum(axis=1)
+    centers = batch_lloyd(x[idx[valid]], np.repeat(np.arange(n_regions), sample_sizes),
+                          np.concatenate([[0], np.cumsum(sample_sizes)]), centers,
+                          None if sample_w is None else sample_w[valid], max_iter, tol)
+    if subsampled.any():
+        centers = batch_lloyd(x, region_ids, bounds, centers, w, refine_iter, tol)
+
+    labels = _batch_assign(x, bounds, centers)
+    counts = np.bincount(region_ids * k + labels, weights=w, minlength=n_regions * k)
+    if order is not None:
+        unsorted = np.empty_like(labels)
+        unsorted[order] = labels
+        labels = unsorted
+    return centers, labels, counts.astype(np.float64).reshape(n_regions, k)
+
+
+def kmeans(pixels, k, weights=None, **kwargs):
+    '''
+    한 영역에 대한 k-means
+    return : centers (k, 3) float32, labels (N,), counts (k,)
+    '''
+    x = np.asarray(pixels).reshape(-1, 3)
+    centers, labels, counts = batch_kmeans(x, np.zeros(len(x), dtype=np.intp), 1, k, weights, **kwargs)
+    return centers[0], labels, counts[0]
+
+
+def bits_for_bin_size(bin_size=HIST_BIN_SIZE):
+    '''
+    bin 한 변(2^(8-bits))이 bin_size 이하가 되는 가장 작은 채널당 bit 수 (3~8)
+    bin_size 8 -> 5 bits (32768 bins), 4 -> 6 bits (262144 bins)
+    '''
+    if bin_size < 1:
+        return 8
+    return int(np.clip(8 - int(np.floor(np.log2(bin_size))), 3, 8))
+
+
+def batch_color_histogram(pixels, region_ids, n_regions, bits):
+    '''
+    uint8 (N, 3) 색상을 채널당 bits만큼 잘라 하나의 bin 번호로 pack한 영역별 3D histogram
+    return : 점유된 bin의 평균 색 (M, 3) float32, bin별 픽셀 수 (M,), bin의 영역 번호 (M,),
+             픽셀별 bin index (N,)
+    bin 중심 대신 평균 색을 쓰므로, 한 bin의 픽셀이 모두 같은 cluster로 가면 center는 전체
+    clustering과 같음. bin이 cluster 경계에 걸치거나 다른 local optimum으로 수렴하면 달라지며
+    그 차이는 bin 크기로 제한되지 않음 (benchmarks/dominant_colors.py로 확인)
+    '''
+    x = np.asarray(pixels, dtype=np.uint8).reshape(-1, 3)
+    q = (x >> (8 - bits)).astype(np.int64)
+    n_bins = 1 << (3 * bits)
+    packed = (np.asarray(region_ids, dtype=np.int64) * n_bins
+              + ((q[:, 0] << (2 * bits)) | (q[:, 1] << bits) | q[:, 2]))
+    if n_regions * n_bins <= _DENSE_HIST_BINS:
+        counts = np.bincount(packed, minlength=n_regions * n_bins)
+        occupied = np.flatnonzero(counts)
+        lookup = np.zeros(len(counts), dtype=np.intp)
+        lookup[occupied] = np.arange(len(occupied))
+        bins, counts = lookup[packed], counts[occupied]
+    else:
+        occupied, bins, counts = np.unique(packed, return_inverse=True, return_counts=True)
+    means = np.empty((len(occupied), 3), dtype=np.float32)
+    for c in range(3):
+        means[:, c] = np.bincount(bins, weights=x[:, c], minlength=len(occupied)) / counts
+    return means, counts, occupied // n_bins, bins.reshape(-1)
+
+
+def color_histogram(pixels, bits):
+    '''
+    한 영역의 3D color histogram
+    return : 점유된 bin의 평균 색 (M, 3), bin별 픽셀 수 (M,), 픽셀별 bin index (N,)
+    '''
+    x = np.asarray(pixels).reshape(-1, 3)
+    means, counts, _, bins = batch_color_histogram(x, np.zeros(len(x), dtype=np.intp), 1, bits)
+    return means, counts, bins
+
+
+def batch_histogram_kmeans(pixels, region_ids, n_regions, k, bin_size=HIST_BIN_SIZE, **kwargs):
+    '''
+    영역별 3D color histogram을 만든 뒤 점유된 bin에 대해서만 가중 k-means 수행
+    비용이 픽셀 수가 아니라 서로 다른 색의 수에 비례함
+    return : batch_kmeans()와 같은 (centers, labels, counts)
+    '''
+    means, bin_counts, bin_regions, bins = batch_color_histogram(
+        pixels, region_ids, n_regions, bits_for_bin_size(bin_size))
+    centers, bin_labels, counts = batch_kmeans(means, bin_regions, n_regions, k, weights=bin_counts, **kwargs)
+    return centers, bin_labels[bins], counts
+
+
+def histogram_kmeans(pixels, k, bin_size=HIST_BIN_SIZE, **kwargs):
+    '''
+    한 영역에 대한 histogram 모드 k-means
+    return : kmeans()와 같은 (centers, labels, counts)
+    '''
+    x = np.asarray(pixels).reshape(-1, 3)
+    centers, labels, counts = batch_histogram_kmeans(
+        x, np.zeros(len(x), dtype=np.intp), 1, k, bin_size, **kwargs)
+    return centers[0], labels, counts[0]
@@ -0,0 +1,39 @@
+import contextlib
+import os
+import tracemalloc
+
+from personal_color_analysis import model_registry
+
+# 기본값(0)은 RSS 변화량만 잼 (/metrics의 pca_analysis_rss_delta_bytes). 1이면 tracemalloc으로 요청별 최대 할당량(peak)도 잼
+# (Python 객체와 numpy/OpenCV 배열, dlib 내부 buffer는 제외). tracemalloc은 한 번 시작하면
+# 프로세스의 모든 할당을 추적하므로 분석 시간이 5~7% 정도 늘어남 (필요할 때만 켬)
+TRACEMALLOC = os.environ.get('MEMORY_TRACKING', '0') == '1'
+
+
+@contextlib.contextmanager
+def track(peak=TRACEMALLOC):
+    '''
+    블록 안에서의 메모리 사용량을 잼
+    peak: tracemalloc으로 최대 할당량을 잴지 여부 (처음 사용할 때 tracemalloc 시작)
+    return : {'peak_bytes': 블록 시작 대비 최대 할당량 (peak일 때만),
+              'rss_delta_bytes': 블록 전후의 RSS 차이} dict (블록이 끝난 뒤에 사용)
+
+    tracemalloc의 peak는 프로세스 전체 값이므로, 한 프로세스에서 한 번에
+    하나의 분석만 할 때 (분석 pool worker) 요청별 값이 정확함
+    '''
+    usage = {}
+    rss_before = model_registry.rss_bytes()
+    if peak:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+    try:
+        yield usage
+    finally:
+        if peak:
+            _, highest = tracemalloc.get_traced_memory()
+            usage['peak_bytes'] = max(0, highest - start)
+        if rss_before:
+            # rss_bytes()는 알 수 없으면 0
+            usage['rss_delta_bytes'] = model_registry.rss_bytes() - rss_before
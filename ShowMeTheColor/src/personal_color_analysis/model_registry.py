@@ -0,0 +1,115 @@
+import os
+import threading
+import time
+
+
+def rss_bytes():
+    # Resident set size of the current process (Linux), 0 if unavailable
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def landmarks_path():
+    '''
+    dlib 68 landmark 모델 파일 경로
+    로컬 실행(res/)과 Docker(/app/res/) 두 경우 모두 지원
+    '''
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    path = os.path.join(current_dir, '..', '..', 'res', 'shape_predictor_68_face_landmarks.dat')
+    if not os.path.exists(path):
+        # Try alternative path for Docker
+        path = '/app/res/shape_predictor_68_face_landmarks.dat'
+    return path
+
+
+class ModelRegistry:
+    '''
+    프로세스 단위로 모델을 한 번만 로드해서 공유하는 저장소
+    get()으로 처음 요청될 때 로드하거나(lazy), preload()로 시작 시점에 미리 로드
+    모델마다 로드 시간과 메모리 사용량(RSS 증가량, 모델 파일 크기)을 기록
+    '''
+
+    def __init__(self):
+        self._loaders = {}
+        self._models = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, loader, path=None):
+        # loader: 인자 없이 모델 객체를 반환하는 함수
+        self._loaders[name] = (loader, path)
+
+    def get(self, name):
+        model = self._models.get(name)
+        if model is not None:
+            return model
+        with self._lock:
+            if name not in self._models:
+                self._load(name)
+            return self._models[name]
+
+    def _load(self, name):
+        if name not in self._loaders:
+            raise KeyError("Unknown model: {}".format(name))
+        loader, path = self._loaders[name]
+        path = path() if callable(path) else path
+
+        rss_before = rss_bytes()
+        start = time.perf_counter()
+        model = loader()
+        load_time = time.perf_counter() - start
+
+        self._models[name] = model
+        self._stats[name] = {
+            'load_time_s': round(load_time, 4),
+            'rss_delta_bytes': max(0, rss_bytes() - rss_before),
+            'file_size_bytes': os.path.getsize(path) if path and os.path.exists(path) else None,
+            'loaded_at': time.time(),
+            'pid': os.getpid()
+        }
+
+    def preload(self, names=None):
+        for name in (names or list(self._loaders)):
+            self.get(name)
+        return self.stats()
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def stats(self):
+        return {
+            name: dict(self._stats[name], loaded=True) if name in self._stats else {'loaded': False}
+            for name in self._loaders
+        }
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            self._stats.clear()
+
+
+def _load_face_detector():
+    import dlib
+    return dlib.get_frontal_face_detector()
+
+
+def _load_shape_predictor():
+    import dlib
+    return dlib.shape_predictor(landmarks_path())
+
+
+# process-wide registry
+registry = ModelRegistry()
+registry.register('face_detector', _load_face_detector)
+registry.register('shape_predictor', _load_shape_predictor, path=landmarks_path)
+
+
+def get_face_detector():
+    return registry.get('face_detector')
+
+
+def get_shape_predictor():
+    return registry.get('shape_predictor')
@@ -2,74 +2,135 @@ import cv2
 import numpy as np
 from personal_color_analysis import tone_analysis
 from personal_color_analysis.detect_face import DetectFace
-from personal_color_analysis.color_extract import DominantColors
-from colormath.color_objects import LabColor, sRGBColor, HSVColor
-from colormath.color_conversions import convert_color
+from personal_color_analysis.color_extract import batch_dominant_colors
+from personal_color_analysis import color_convert
 
-def analysis(imgpath):
-    try:
-        #######################################
-        #           Face detection            #
-        #######################################
-        df = DetectFace(imgpath)
-        face = [df.left_cheek, df.right_cheek,
-                df.left_eyebrow, df.right_eyebrow,
-                df.left_eye, df.right_eye]
-
-        #######################################
-        #         Get Dominant Colors         #
-        #######################################
-        temp = []
-        clusters = 4
-        for f in face:
-            dc = DominantColors(f, clusters)
-            face_part_color, _ = dc.getHistogram()
-            #dc.plotHistogram()
-            temp.append(np.array(face_part_color[0]))
+# 한 얼굴에서 dominant color를 뽑는 영역 순서
+FACE_PARTS = ['left_cheek', 'right_cheek', 'left_eyebrow', 'right_eyebrow', 'left_eye', 'right_eye']
+CLUSTERS = 4
+# 분석 결과가 바뀌는 변경(영역, clustering, 기준값 등)마다 올림. 결과 cache key에 사용
+ENGINE_VERSION = '3'
+
+
+def face_regions(image):
+    '''
+    image에서 얼굴을 찾아 FACE_PARTS 순서로 영역 픽셀 배열의 list를 반환
+    얼굴이 이미지 가장자리에 걸쳐 영역에 픽셀이 없으면 ValueError
+    '''
+    df = DetectFace(image)
+    regions = [getattr(df, part) for part in FACE_PARTS]
+    for part, region in zip(FACE_PARTS, regions):
+        if np.asarray(region).size == 0:
+            raise ValueError("No pixels in the {} region".format(part))
+    return regions
+
+
+# tone_analysis.classify()의 season -> (tone, season) 출력 문구
+TONES = {
+    'spring': ('봄웜톤(spring)', '봄'),
+    'autumn': ('가을웜톤(autumn)', '가을'),
+    'summer': ('여름쿨톤(summer)', '여름'),
+    'winter': ('겨울쿨톤(winter)', '겨울'),
+}
+
+
+def features(temps):
+    '''
+    temps: 이미지마다 FACE_PARTS 순서의 영역별 dominant color (RGB)
+    return : Lab_b (M, 3), hsv_s (M, 3) [skin, eyebrow, eye], 모든 색을 한 번에 변환
+    '''
+    colors = []
+    for temp in temps:
         cheek = np.mean([temp[0], temp[1]], axis=0)
         eyebrow = np.mean([temp[2], temp[3]], axis=0)
         eye = np.mean([temp[4], temp[5]], axis=0)
+        colors += [cheek, eyebrow, eye]
+    lab_b, hsv_s = color_convert.lab_b_hsv_s(np.array(colors).reshape(-1, 3))
+    return lab_b.reshape(-1, 3), hsv_s.reshape(-1, 3)
+
+
+def make_result(Lab_b, hsv_s, label, name):
+    '''
+    Lab_b, hsv_s: [skin, eyebrow, eye] 특징값, label: tone_analysis.classify()의 season
+    '''
+    print('Lab_b[skin, eyebrow, eye]',Lab_b)
+    print('hsv_s[skin, eyebrow, eye]',hsv_s)
+    tone, season = TONES[label]
+    # Print Result
+    print('{}의 퍼스널 컬러는 {}입니다.'.format(name, tone))
+
+    # Return result dictionary
+    return {
+        'season': season,
+        'tone': tone,
+        'lab_b': Lab_b,
+        'hsv_s': hsv_s
+    }
 
-        Lab_b, hsv_s = [], []
-        color = [cheek, eyebrow, eye]
-        for i in range(3):
-            rgb = sRGBColor(color[i][0], color[i][1], color[i][2], is_upscaled=True)
-            lab = convert_color(rgb, LabColor, through_rgb_type=sRGBColor)
-            hsv = convert_color(rgb, HSVColor, through_rgb_type=sRGBColor)
-            Lab_b.append(float(format(lab.lab_b,".2f")))
-            hsv_s.append(float(format(hsv.hsv_s,".2f"))*100)
-
-        print('Lab_b[skin, eyebrow, eye]',Lab_b)
-        print('hsv_s[skin, eyebrow, eye]',hsv_s)
-        #######################################
-        #      Personal color Analysis        #
-        #######################################
-        Lab_weight = [30, 20, 5]
-        hsv_weight = [10, 1, 1]
-        if(tone_analysis.is_warm(Lab_b, Lab_weight)):
-            if(tone_analysis.is_spr(hsv_s, hsv_weight)):
-                tone = '봄웜톤(spring)'
-                season = '봄'
-            else:
-                tone = '가을웜톤(autumn)'
-                season = '가을'
-        else:
-            if(tone_analysis.is_smr(hsv_s, hsv_weight)):
-                tone = '여름쿨톤(summer)'
-                season = '여름'
-            else:
-                tone = '겨울쿨톤(winter)'
-                season = '겨울'
-        # Print Result
-        print('{}의 퍼스널 컬러는 {}입니다.'.format(imgpath, tone))
-        
-        # Return result dictionary
-        return {
-            'season': season,
-            'tone': tone,
-            'lab_b': Lab_b,
-            'hsv_s': hsv_s
-        }
+
+def analysis(image, name=None):
+    '''
+    image: 파일 경로, 인코딩된 이미지 바이트(bytes, memoryview) 또는 BGR np.ndarray
+    name: 결과 출력에 사용할 이미지 이름 (기본값은 파일 경로)
+    '''
+    return analysis_many([image], None if name is None else [name])[0]
+
+
+def analysis_many(images, names=None):
+    '''
+    여러 이미지를 분석. 얼굴 검출은 이미지마다 하고, 모든 이미지의 얼굴 영역
+    (이미지 수 x 6개)은 한 번의 batch k-means로 dominant color를 계산
+    return : 이미지 순서대로 analysis()와 같은 결과 dict (실패한 이미지는 None)
+    '''
+    if names is None:
+        names = [image if isinstance(image, str) else 'image' for image in images]
+
+    #######################################
+    #           Face detection            #
+    #######################################
+    faces = []
+    for image, name in zip(images, names):
+        try:
+            faces.append(face_regions(image))
+        except Exception as e:
+            print(f"Error in analysis of {name}: {str(e)}")
+            faces.append(None)
+
+    #######################################
+    #         Get Dominant Colors         #
+    #######################################
+    detected = [face for face in faces if face is not None]
+    try:
+        region_colors = batch_dominant_colors(
+            [part for face in detected for part in face], CLUSTERS) if detected else []
     except Exception as e:
+        # 어느 이미지 때문인지 모르므로 한 장씩 다시 계산 (실패한 이미지만 None)
         print(f"Error in analysis: {str(e)}")
-        return None
+        region_colors = []
+        for i, (face, name) in enumerate(zip(faces, names)):
+            if face is None:
+                continue
+            try:
+                region_colors += batch_dominant_colors(face, CLUSTERS)
+            except Exception as e:
+                print(f"Error in analysis of {name}: {str(e)}")
+                faces[i] = None
+
+    dominant = [np.array(colors[0]) for colors, _ in region_colors]
+    n = len(FACE_PARTS)
+    lab_b, hsv_s = features([dominant[i:i + n] for i in range(0, len(dominant), n)])
+
+    #######################################
+    #      Personal color Analysis        #
+    #######################################
+    labels, _, _ = tone_analysis.classify(lab_b, hsv_s)
+
+    results = []
+    row = 0
+    for face, name in zip(faces, names):
+        if face is None:
+            results.append(None)
+            continue
+        results.append(make_result(lab_b[row].tolist(), hsv_s[row].tolist(), labels[row], name))
+        row += 1
+    return results
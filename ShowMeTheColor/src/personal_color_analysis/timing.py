@@ -0,0 +1,157 @@
+import contextlib
+import contextvars
+import functools
+import os
+import threading
+import time
+
+# 0이면 record()가 아무것도 기록하지 않음 (stage()는 contextvar 조회 한 번만 하고 끝남)
+ENABLED = os.environ.get('STAGE_TIMING', '1') != '0'
+
+# aggregate histogram의 bucket 상한 (초)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 현재 요청의 _Recorder (record() 밖에서는 None)
+_current = contextvars.ContextVar('stage_timing', default=None)
+
+
+class _Recorder:
+    def __init__(self):
+        self.stages = {}
+        self.stack = []
+        self.values = {}
+
+
+class stage:
+    '''
+    분석 단계의 시간을 재는 context manager / decorator
+
+        with timing.stage('detect'):
+            ...
+
+        @timing.stage('color_convert')
+        def lab_b_hsv_s(rgb): ...
+
+    record() 안에서만 기록하고, 중첩된 단계의 시간은 바깥 단계에서 빼서
+    단계별 시간의 합이 전체 시간이 되도록 함 (같은 이름은 누적)
+    '''
+    __slots__ = ('name', 'recorder', 'start', 'children')
+
+    def __init__(self, name):
+        self.name = name
+        self.recorder = None
+
+    def __enter__(self):
+        self.recorder = _current.get()
+        if self.recorder is not None:
+            self.children = 0.0
+            self.recorder.stack.append(self)
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        recorder = self.recorder
+        if recorder is None:
+            return False
+        elapsed = time.perf_counter() - self.start
+        recorder.stack.pop()
+        recorder.stages[self.name] = recorder.stages.get(self.name, 0.0) + elapsed - self.children
+        if recorder.stack:
+            recorder.stack[-1].children += elapsed
+        self.recorder = None
+        return False
+
+    def __call__(self, fn):
+        name = self.name
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+
+
+@contextlib.contextmanager
+def record():
+    '''
+    이 블록 안에서 실행된 stage()의 시간을 모음
+    return : {단계 이름: 초} dict (블록이 끝난 뒤에 사용), ENABLED가 아니면 빈 dict
+    '''
+    if not ENABLED:
+        yield {}
+        return
+    recorder = _Recorder()
+    token = _current.set(recorder)
+    try:
+        yield recorder.stages
+    finally:
+        _current.reset(token)
+
+
+def annotate(name, value):
+    '''
+    record() 안에서 요청에 대한 값을 남김 (예: decode된 pixel 수), 밖에서는 무시
+    '''
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.values[name] = value
+
+
+def annotations():
+    # 현재 record() 블록에서 annotate()로 남긴 {이름: 값}
+    recorder = _current.get()
+    return {} if recorder is None else dict(recorder.values)
+
+
+class StageHistogram:
+    '''
+    단계별 시간의 누적 histogram (프로세스 단위, Prometheus histogram과 같은 누적 bucket)
+    '''
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stages):
+        # stages: record()가 모은 {단계 이름: 초}
+        with self._lock:
+            for name, seconds in stages.items():
+                entry = self._stages.get(name)
+                if entry is None:
+                    entry = self._stages[name] = {'count': 0, 'sum': 0.0, 'buckets': [0] * len(self.buckets)}
+                entry['count'] += 1
+                entry['sum'] += seconds
+                for i, bound in enumerate(self.buckets):
+                    if seconds <= bound:
+                        entry['buckets'][i] += 1
+
+    def snapshot(self):
+        # {단계 이름: {'count', 'sum', 'buckets': [(상한, 누적 count)]}}
+        with self._lock:
+            return {
+                name: {'count': e['count'], 'sum': e['sum'], 'buckets': list(zip(self.buckets, e['buckets']))}
+                for name, e in self._stages.items()
+            }
+
+    def stats(self):
+        return {
+            name: {
+                'count': e['count'],
+                'mean_ms': round(e['sum'] / e['count'] * 1000, 2) if e['count'] else None,
+                'buckets': {'le_{:g}'.format(bound): count for bound, count in e['buckets']}
+            }
+            for name, e in self.snapshot().items()
+        }
+
+
+# process-wide aggregate
+histogram = StageHistogram()
+
+
+def observe(stages):
+    histogram.observe(stages)
+
+
+def as_ms(stages):
+    return {name: round(seconds * 1000, 2) for name, seconds in stages.items()}
@@ -2,6 +2,53 @@ from scipy.spatial import distance
 import copy
 import math
 import operator
+import numpy as np
+from personal_color_analysis import timing
+
+# 기준값과 가중치 [skin, eyebrow, eye]
+WARM_B_STD = [11.6518, 11.71445, 3.6484]
+COOL_B_STD = [4.64255, 4.86635, 0.18735]
+SPR_S_STD = [18.59296, 30.30303, 25.80645]
+AUT_S_STD = [27.13987, 39.75155, 37.5]
+SMR_S_STD = [12.5, 21.7195, 24.77064]
+WNT_S_STD = [16.73913, 24.8276, 31.3726]
+LAB_WEIGHT = [30, 20, 5]
+HSV_WEIGHT = [10, 1, 1]
+# summer/winter 구분에서는 eyebrow 영향력 적기 때문에 가중치 줄임
+SMR_EYEBROW_WEIGHT = 0.5
+
+SEASONS = np.array(['spring', 'autumn', 'summer', 'winter'])
+
+
+def margin(x, a_std, b_std, a):
+    '''
+    x : (N, 3) 특징값, a : 가중치 [skin, eyebrow, eye]
+    return : (N,) b 기준값과의 가중 거리 - a 기준값과의 가중 거리
+             0 이상이면 a 쪽이 가깝거나 같음
+    '''
+    x = np.asarray(x, dtype=np.float64).reshape(-1, 3)
+    a = np.asarray(a, dtype=np.float64)
+    return (np.abs(x - b_std) * a).sum(axis=1) - (np.abs(x - a_std) * a).sum(axis=1)
+
+
+@timing.stage('tone_analysis')
+def classify(lab_b, hsv_s, lab_weight=LAB_WEIGHT, hsv_weight=HSV_WEIGHT):
+    '''
+    N명의 특징값을 한 번에 분류 (출력이나 인자 변경 없음)
+    lab_b, hsv_s : (N, 3) [skin, eyebrow, eye]
+    return : season (N,) 'spring' / 'autumn' / 'summer' / 'winter',
+             warm_margin (N,) 0 이상이면 warm,
+             season_margin (N,) warm이면 spring 쪽, cool이면 summer 쪽으로 0 이상
+    '''
+    smr_weight = np.array(hsv_weight, dtype=np.float64)
+    smr_weight[1] = SMR_EYEBROW_WEIGHT
+    warm_margin = margin(lab_b, WARM_B_STD, COOL_B_STD, lab_weight)
+    warm = warm_margin >= 0
+    season_margin = np.where(warm, margin(hsv_s, SPR_S_STD, AUT_S_STD, hsv_weight),
+                             margin(hsv_s, SMR_S_STD, WNT_S_STD, smr_weight))
+    season = SEASONS[np.where(warm, 0, 2) + (season_margin < 0)]
+    return season, warm_margin, season_margin
+
 
 def is_warm(lab_b, a):
     '''
@@ -10,25 +57,7 @@ def is_warm(lab_b, a):
     질의색상 lab_b값에서 warm의 lab_b, cool의 lab_b값 간의 거리를
     각각 계산하여 warm이 가까우면 1, 반대 경우 0 리턴
     '''
-    # standard of skin, eyebrow, eye
-    warm_b_std = [11.6518, 11.71445, 3.6484]
-    cool_b_std = [4.64255, 4.86635, 0.18735]
-
-    warm_dist = 0
-    cool_dist = 0
-
-    body_part = ['skin', 'eyebrow', 'eye']
-    for i in range(3):
-        warm_dist += abs(lab_b[i] - warm_b_std[i]) * a[i]
-        #print(body_part[i],"의 warm 기준값과의 거리")
-        #print(abs(lab_b[i] - warm_b_std[i]))
-        cool_dist += abs(lab_b[i] - cool_b_std[i]) * a[i]
-        #print(body_part[i],"의 cool 기준값과의 거리")
-        #print(abs(lab_b[i] - cool_b_std[i]))
-    if(warm_dist <= cool_dist):
-        return 1 #warm
-    else:
-        return 0 #cool
+    return int(margin(lab_b, WARM_B_STD, COOL_B_STD, a)[0] >= 0)
 
 def is_spr(hsv_s, a):
     '''
@@ -37,52 +66,15 @@ def is_spr(hsv_s, a):
     질의색상 hsv_s값에서 spring의 hsv_s, autumn의 hsv_s값 간의 거리를
     각각 계산하여 spring이 가까우면 1, 반대 경우 0 리턴
     '''
-    #skin, hair, eye
-    spr_s_std = [18.59296, 30.30303, 25.80645]
-    aut_s_std = [27.13987, 39.75155, 37.5]
-
-    spr_dist = 0
-    aut_dist = 0
-
-    body_part = ['skin', 'eyebrow', 'eye']
-    for i in range(3):
-        spr_dist += abs(hsv_s[i] - spr_s_std[i]) * a[i]
-        print(body_part[i],"의 spring 기준값과의 거리")
-        print(abs(hsv_s[i] - spr_s_std[i]) * a[i])
-        aut_dist += abs(hsv_s[i] - aut_s_std[i]) * a[i]
-        print(body_part[i],"의 autumn 기준값과의 거리")
-        print(abs(hsv_s[i] - aut_s_std[i]) * a[i])
-
-    if(spr_dist <= aut_dist):
-        return 1 #spring
-    else:
-        return 0 #autumn
+    return int(margin(hsv_s, SPR_S_STD, AUT_S_STD, a)[0] >= 0)
 
 def is_smr(hsv_s, a):
     '''
     파라미터 hsv_s = [skin_s, hair_s, eye_s]
-    a = 가중치 [skin, hair, eye]
+    a = 가중치 [skin, hair, eye] (eyebrow 가중치는 SMR_EYEBROW_WEIGHT로 대체, a는 변경하지 않음)
     질의색상 hsv_s값에서 summer의 hsv_s, winter의 hsv_s값 간의 거리를
     각각 계산하여 summer가 가까우면 1, 반대 경우 0 리턴
     '''
-    #skin, eyebrow, eye
-    smr_s_std = [12.5, 21.7195, 24.77064]
-    wnt_s_std = [16.73913, 24.8276, 31.3726]
-    a[1] = 0.5 # eyebrow 영향력 적기 때문에 가중치 줄임
-
-    smr_dist = 0
-    wnt_dist = 0
-
-    body_part = ['skin', 'eyebrow', 'eye']
-    for i in range(3):
-        smr_dist += abs(hsv_s[i] - smr_s_std[i]) * a[i]
-        print(body_part[i],"의 summer 기준값과의 거리")
-        print(abs(hsv_s[i] - smr_s_std[i]) * a[i])
-        wnt_dist += abs(hsv_s[i] - wnt_s_std[i]) * a[i]
-        print(body_part[i],"의 winter 기준값과의 거리")
-        print(abs(hsv_s[i] - wnt_s_std[i]) * a[i])
-
-    if(smr_dist <= wnt_dist):
-        return 1 #summer
-    else:
-        return 0 #winter
+    a = list(a)
+    a[1] = SMR_EYEBROW_WEIGHT
+    return int(margin(hsv_s, SMR_S_STD, WNT_S_STD, a)[0] >= 0)
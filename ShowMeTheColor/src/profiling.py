@@ -0,0 +1,215 @@
+"""
+Opt-in profiling of live analyses.
+
+Slow requests often only reproduce with real user photos, so a fraction of
+the analyses (PROFILE_SAMPLE_RATE) or a request carrying the admin header
+X-Profile: <PROFILE_TOKEN> is profiled in the worker that runs it. Each
+profile is written to PROFILE_DIR as
+
+    <id>.folded  collapsed stacks ("frame;frame;frame count", for flamegraph.pl / speedscope)
+    <id>.prof    pstats dump (PROFILE_MODE=cprofile, for snakeviz / python -m pstats)
+    <id>.json    engine, image dimensions, upload size, stage timings and memory of the analysis
+
+and only the latest PROFILE_MAX_FILES profiles are kept. The sampler reads
+the stack of the analysing thread every PROFILE_INTERVAL_MS, which costs
+far less than cProfile's per-call hooks and leaves the timings comparable.
+
+Environment:
+    PROFILE_SAMPLE_RATE   fraction of analyses profiled, 0 to 1 (default 0, off)
+    PROFILE_TOKEN         value of the X-Profile header that profiles a request and
+                          lists the profiles at GET /profiles (default: both disabled)
+    PROFILE_MODE          sample (stack sampler, collapsed stacks) or cprofile (pstats + collapsed stacks) (default sample)
+    PROFILE_INTERVAL_MS   stack sampling interval (default 5)
+    PROFILE_DIR           directory of the profiles (default: pca-profiles in the temp directory)
+    PROFILE_MAX_FILES     profiles kept in PROFILE_DIR (default 50)
+"""
+import cProfile
+import glob
+import hmac
+import json
+import os
+import pstats
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from personal_color_analysis import image_decode
+
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN', '')
+PROFILE_MODE = os.environ.get('PROFILE_MODE', 'sample')
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', 5))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(tempfile.gettempdir(), 'pca-profiles'))
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 50))
+
+if PROFILE_MODE not in ('sample', 'cprofile'):
+    raise ValueError("Unknown PROFILE_MODE: {} (available: sample, cprofile)".format(PROFILE_MODE))
+
+
+def requested(header):
+    """Whether a request with this X-Profile header value asked to be profiled"""
+    return bool(PROFILE_TOKEN) and header is not None and hmac.compare_digest(header, PROFILE_TOKEN)
+
+
+def sampled():
+    """Whether this analysis is one of the PROFILE_SAMPLE_RATE sampled ones"""
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _frame_name(code):
+    return '{} ({}:{})'.format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+class StackSampler:
+    """Counts the stacks of the thread that entered it, sampled from a helper thread"""
+
+    def __init__(self, interval=PROFILE_INTERVAL_MS / 1000):
+        self.interval = interval
+        self.stacks = Counter()
+        self._thread_id = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def folded(self):
+        return ''.join('{} {}\n'.format(stack, count) for stack, count in self.stacks.most_common())
+
+
+def _folded_from_pstats(stats):
+    # cProfile only knows caller -> callee edges, so the stacks are the call
+    # chains by own time of each function through its heaviest callers
+    callers = {func: entry[4] for func, entry in stats.stats.items()}
+    lines = []
+    for func, (_, _, tottime, _, _) in stats.stats.items():
+        if tottime <= 0:
+            continue
+        chain, seen = [func], {func}
+        while callers.get(chain[-1]):
+            caller = max(callers[chain[-1]].items(), key=lambda item: item[1][3])[0]
+            if caller in seen:
+                break
+            chain.append(caller)
+            seen.add(caller)
+        frames = ['{} ({}:{})'.format(name, os.path.basename(path), line) for path, line, name in reversed(chain)]
+        # microseconds as sample counts
+        lines.append('{} {}\n'.format(';'.join(frames), max(1, int(tottime * 1e6))))
+    return ''.join(lines)
+
+
+class Profiler:
+    """
+    Context manager profiling the analysis run in it (in the worker),
+    save() writes the profile files and returns the profile id
+    """
+
+    def __init__(self, mode=PROFILE_MODE):
+        self.mode = mode
+        self._profiler = cProfile.Profile() if mode == 'cprofile' else StackSampler()
+
+    def __enter__(self):
+        if self.mode == 'cprofile':
+            self._profiler.enable()
+        else:
+            self._profiler.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        if self.mode == 'cprofile':
+            self._profiler.disable()
+        else:
+            self._profiler.__exit__(*exc)
+        return False
+
+    def save(self, engine, contents, measurement):
+        """
+        Write the profile with its tags to PROFILE_DIR and rotate the old ones
+        return : profile id, None if it could not be written
+        """
+        profile_id = '{}-{}-{}'.format(int(time.time() * 1000), os.getpid(), engine)
+        base = os.path.join(PROFILE_DIR, profile_id)
+        try:
+            fmt, width, height = image_decode.image_size(contents)
+        except (OSError, ValueError):
+            fmt, width, height = None, None, None
+        tags = {
+            'id': profile_id,
+            'engine': engine,
+            'mode': self.mode,
+            'created_at': time.time(),
+            'image': {
+                'format': fmt, 'width': width, 'height': height,
+                'decoded_pixels': measurement['values'].get('decoded_pixels')
+            },
+            'upload_bytes': len(contents),
+            'latency_ms': round(measurement['latency_s'] * 1000, 2),
+            'stages_ms': {name: round(seconds * 1000, 2) for name, seconds in measurement['stages'].items()},
+            'memory': measurement['memory']
+        }
+        try:
+            os.makedirs(PROFILE_DIR, exist_ok=True)
+            if self.mode == 'cprofile':
+                stats = pstats.Stats(self._profiler)
+                stats.dump_stats(base + '.prof')
+                folded = _folded_from_pstats(stats)
+            else:
+                tags['interval_ms'] = self._profiler.interval * 1000
+                tags['samples'] = sum(self._profiler.stacks.values())
+                folded = self._profiler.folded()
+            with open(base + '.folded', 'w') as f:
+                f.write(folded)
+            # written last: a profile is listed once its tags exist
+            with open(base + '.json', 'w') as f:
+                json.dump(tags, f, ensure_ascii=False, indent=2)
+            rotate()
+        except OSError as e:
+            print(f"Could not write profile {profile_id}: {str(e)}")
+            return None
+        return profile_id
+
+
+def rotate(max_files=PROFILE_MAX_FILES):
+    """Delete all but the latest max_files profiles (ids start with the time in ms)"""
+    tags = sorted(glob.glob(os.path.join(PROFILE_DIR, '*.json')), key=os.path.basename)
+    for path in tags[:max(0, len(tags) - max_files)]:
+        base = path[:-len('.json')]
+        for ext in ('.json', '.folded', '.prof'):
+            try:
+                os.remove(base + ext)
+            except FileNotFoundError:
+                # another worker rotated it already
+                pass
+
+
+def recent(limit=20):
+    """Tags of the latest profiles, newest first"""
+    profiles = []
+    for path in sorted(glob.glob(os.path.join(PROFILE_DIR, '*.json')), key=os.path.basename, reverse=True)[:limit]:
+        try:
+            with open(path) as f:
+                profiles.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+    return profiles
@@ -0,0 +1,59 @@
+"""
+Season names and the color recommendations returned for each season,
+shared by every analysis engine.
+"""
+
+# Map Korean seasons to English
+SEASON_MAP = {
+    '봄': 'spring',
+    '여름': 'summer',
+    '가을': 'autumn',
+    '겨울': 'winter'
+}
+
+SEASONS = ['spring', 'summer', 'autumn', 'winter']
+
+# Define best and worst colors for each season
+COLOR_RECOMMENDATIONS = {
+    'spring': {
+        'personal_color': '봄 웜톤',
+        'personal_color_en': 'Spring Warm',
+        'best_colors': ['#FFB3BA', '#FFCC99', '#FFFFCC', '#CCFFCC'],
+        'worst_colors': ['#4A4A4A', '#000080', '#800080', '#2F4F4F'],
+        'description': '밝고 화사한 따뜻한 색감이 어울리는 타입'
+    },
+    'summer': {
+        'personal_color': '여름 쿨톤',
+        'personal_color_en': 'Summer Cool',
+        'best_colors': ['#E6E6FA', '#FFE4E1', '#F0E68C', '#DDA0DD'],
+        'worst_colors': ['#FF4500', '#FF6347', '#DC143C', '#8B4513'],
+        'description': '부드럽고 차분한 시원한 색감이 어울리는 타입'
+    },
+    'autumn': {
+        'personal_color': '가을 웜톤',
+        'personal_color_en': 'Autumn Warm',
+        'best_colors': ['#CD853F', '#D2691E', '#B8860B', '#8B4513'],
+        'worst_colors': ['#FF69B4', '#FF1493', '#C71585', '#DB7093'],
+        'description': '깊고 풍부한 따뜻한 색감이 어울리는 타입'
+    },
+    'winter': {
+        'personal_color': '겨울 쿨톤',
+        'personal_color_en': 'Winter Cool',
+        'best_colors': ['#4169E1', '#0000CD', '#191970', '#000080'],
+        'worst_colors': ['#FFD700', '#FFA500', '#FF8C00', '#FF7F50'],
+        'description': '선명하고 대비가 강한 시원한 색감이 어울리는 타입'
+    }
+}
+
+# Used when an engine has no confidence score of its own
+DEFAULT_CONFIDENCE = 85.0
+
+
+def season_en(season):
+    """English season name of a Korean ('봄') or English ('spring') season"""
+    return SEASON_MAP.get(season, season)
+
+
+def recommendation_for(season):
+    """Recommendation of a season, spring for an unknown one"""
+    return COLOR_RECOMMENDATIONS.get(season_en(season), COLOR_RECOMMENDATIONS['spring'])
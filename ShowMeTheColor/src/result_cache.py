@@ -0,0 +1,219 @@
+"""
+Content-addressed cache for analysis results.
+
+Keys are the sha256 of the uploaded bytes plus a version string of the
+analysis configuration, so a retry of the same photo skips decoding and
+analysis entirely, and changing the engine invalidates old entries.
+The memory tier is an LRU bounded by entry count with a TTL per entry; an
+optional disk tier (one JSON file per key) survives restarts and is shared
+by processes on the same host. SingleFlight covers the window before a
+result is cached: identical uploads that arrive while the first one is
+still being analysed wait for that analysis instead of starting their own.
+
+Environment:
+    RESULT_CACHE_SIZE   entries kept in memory (0 disables the cache)
+    RESULT_CACHE_TTL    seconds an entry stays valid
+    RESULT_CACHE_DIR    directory of the disk tier (unset = memory only)
+    RESULT_CACHE_DISK_SIZE  files kept in the disk tier
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+RESULT_CACHE_SIZE = int(os.environ.get('RESULT_CACHE_SIZE', 1024))
+RESULT_CACHE_TTL = float(os.environ.get('RESULT_CACHE_TTL', 24 * 3600))
+RESULT_CACHE_DIR = os.environ.get('RESULT_CACHE_DIR') or None
+RESULT_CACHE_DISK_SIZE = int(os.environ.get('RESULT_CACHE_DISK_SIZE', 10000))
+
+DISK_PRUNE_EVERY = 100
+
+MISS = object()
+
+
+def content_key(contents, version):
+    """Cache key of an upload: sha256 of the bytes and the engine version"""
+    return '{}-{}'.format(hashlib.sha256(contents).hexdigest(), version)
+
+
+class ResultCache:
+    """
+    LRU + TTL cache of JSON-serializable values with an optional disk tier.
+    get() returns MISS when the key is absent or expired.
+    """
+
+    def __init__(self, max_entries=RESULT_CACHE_SIZE, ttl=RESULT_CACHE_TTL,
+                 disk_dir=RESULT_CACHE_DIR, disk_entries=RESULT_CACHE_DISK_SIZE):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.disk_entries = disk_entries
+        self._entries = OrderedDict()
+        self._disk_writes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0, 'expired': 0}
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def get(self, key):
+        if not self.enabled:
+            return MISS
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self._stats['hits'] += 1
+                    return value
+                del self._entries[key]
+                self._stats['expired'] += 1
+        entry = self._disk_get(key, now)
+        if entry is None:
+            with self._lock:
+                self._stats['misses'] += 1
+            return MISS
+        expires_at, value = entry
+        with self._lock:
+            self._stats['disk_hits'] += 1
+            self._put(key, expires_at, value)
+        return value
+
+    def set(self, key, value):
+        if not self.enabled:
+            return
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            self._put(key, expires_at, value)
+        self._disk_set(key, expires_at, value)
+
+    def _put(self, key, expires_at, value):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats['evictions'] += 1
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key + '.json')
+
+    def _disk_get(self, key, now):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get('expires_at', 0) <= now:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        return entry['expires_at'], entry['value']
+
+    def _disk_set(self, key, expires_at, value):
+        if not self.disk_dir:
+            return
+        # write to a temp file and rename so readers never see a partial file
+        path = self._disk_path(key)
+        tmp = '{}.{}.tmp'.format(path, os.getpid())
+        try:
+            with open(tmp, 'w') as f:
+                json.dump({'expires_at': expires_at, 'value': value}, f, ensure_ascii=False)
+            os.replace(tmp, path)
+        except (OSError, TypeError, ValueError):
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            return
+        # listing the directory is not free, only check the size every DISK_PRUNE_EVERY writes
+        self._disk_writes += 1
+        if self._disk_writes % DISK_PRUNE_EVERY == 0:
+            self._disk_prune()
+
+    def _disk_prune(self):
+        try:
+            names = [n for n in os.listdir(self.disk_dir) if n.endswith('.json')]
+        except OSError:
+            return
+        if len(names) <= self.disk_entries:
+            return
+        try:
+            paths = sorted((os.path.join(self.disk_dir, n) for n in names), key=os.path.getmtime)
+        except OSError:
+            # another process removed a file while listing, try again on a later write
+            return
+        for path in paths[:len(paths) - self.disk_entries]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            lookups = self._stats['hits'] + self._stats['disk_hits'] + self._stats['misses']
+            hit_rate = (self._stats['hits'] + self._stats['disk_hits']) / lookups if lookups else 0.0
+            return dict(self._stats, entries=len(self._entries), max_entries=self.max_entries,
+                        ttl_s=self.ttl, disk_dir=self.disk_dir, hit_rate=round(hit_rate, 4))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key: the first call runs, the
+    ones arriving before it finishes await its result (or its exception).
+    The call runs in its own task, so a leader whose client goes away does
+    not cancel it for the others. Only used from the event loop.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._stats = {'leaders': 0, 'coalesced': 0, 'saved_s': 0.0}
+
+    async def do(self, key, fn, *args):
+        """
+        await fn(*args), or the running call of the same key.
+        return : (result, coalesced) where coalesced is True if the result came from another call
+        """
+        task = self._calls.get(key)
+        if task is not None:
+            self._stats['coalesced'] += 1
+            result, elapsed = await asyncio.shield(task)
+            # time of the call this one did not have to repeat (queue wait + analysis)
+            self._stats['saved_s'] += elapsed
+            return result, True
+        self._stats['leaders'] += 1
+        task = asyncio.ensure_future(self._timed(fn, *args))
+        self._calls[key] = task
+        task.add_done_callback(lambda done: self._done(key, done))
+        result, _ = await asyncio.shield(task)
+        return result, False
+
+    @staticmethod
+    async def _timed(fn, *args):
+        start = time.perf_counter()
+        result = await fn(*args)
+        return result, time.perf_counter() - start
+
+    def _done(self, key, task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # retrieve the exception so an abandoned call does not log "never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        return dict(self._stats, in_flight=len(self._calls), saved_s=round(self._stats['saved_s'], 3))
@@ -0,0 +1,67 @@
+import os
+import sys
+
+import pytest
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import admission
+
+
+def test_admit_counts_every_admission():
+    control = admission.AdmissionControl(concurrency=1, queue=2)
+    control.admit(2)
+    with pytest.raises(admission.Overloaded):
+        control.admit(2)
+    control.admit()
+    assert control.in_flight == 3
+    control.release(2)
+    control.release()
+    assert control.in_flight == 0
+    assert control.stats()['rejected'] == 1
+
+
+def batch_app(control, on_reject=None):
+    async def batch(request):
+        try:
+            control.admit_more(request, int(request.query_params['files']) - 1)
+        except admission.Overloaded as e:
+            return admission.overloaded_response(e.retry_after)
+        return JSONResponse({'in_flight': control.in_flight})
+
+    app = Starlette(routes=[Route('/batch', batch, methods=['POST'])])
+    app.add_middleware(admission.AdmissionMiddleware, control=control, paths=['/batch'], on_reject=on_reject)
+    return app
+
+
+def test_batch_takes_one_admission_per_file():
+    control = admission.AdmissionControl(concurrency=1, queue=4)
+    with TestClient(batch_app(control)) as client:
+        response = client.post('/batch?files=5')
+        assert response.status_code == 200
+        assert response.json() == {'in_flight': 5}
+        # released together with the request
+        assert control.in_flight == 0
+
+
+def test_batch_over_the_free_admissions_is_rejected():
+    control = admission.AdmissionControl(concurrency=1, queue=4)
+    control.admit(2)
+    with TestClient(batch_app(control)) as client:
+        response = client.post('/batch?files=4')
+        assert response.status_code == 503
+        assert 'Retry-After' in response.headers
+    assert control.in_flight == 2
+
+
+def test_rejected_request_is_reported():
+    control = admission.AdmissionControl(concurrency=1, queue=0)
+    control.admit()
+    rejected = []
+    app = batch_app(control, on_reject=lambda path, status: rejected.append((path, status)))
+    with TestClient(app) as client:
+        assert client.post('/batch?files=1').status_code == 503
+    assert rejected == [('/batch', 503)]
@@ -0,0 +1,102 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from analysis_pool import AnalysisPool, AnalysisTimeout
+
+
+def running(pid):
+    # a terminated worker stays a zombie until it is reaped, count that as gone
+    try:
+        with open('/proc/{}/stat'.format(pid)) as f:
+            return f.read().rsplit(')', 1)[1].split()[0] != 'Z'
+    except FileNotFoundError:
+        return False
+    except OSError:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        return True
+
+
+def test_timed_out_worker_is_terminated():
+    pool = AnalysisPool(workers=1, timeout=1, max_tasks_per_worker=0)
+
+    async def scenario():
+        pid = await pool.run(os.getpid)
+        with pytest.raises(AnalysisTimeout):
+            await pool.run(time.sleep, 60)
+        # terminated pool.timeout after the timeout
+        deadline = time.monotonic() + 10
+        while running(pid) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        return pid
+
+    try:
+        pid = asyncio.run(scenario())
+        assert not running(pid)
+        assert pool.stats()['timeouts'] == 1
+        assert pool.stats()['recycles'] == 1
+    finally:
+        pool.shutdown()
+
+
+def test_recycled_pool_keeps_working():
+    pool = AnalysisPool(workers=1, timeout=1, max_tasks_per_worker=0)
+
+    async def scenario():
+        first = await pool.run(os.getpid)
+        with pytest.raises(AnalysisTimeout):
+            await pool.run(time.sleep, 60)
+        return first, await pool.run(os.getpid)
+
+    try:
+        first, second = asyncio.run(scenario())
+        assert first != second
+    finally:
+        pool.shutdown()
+
+
+def test_wait_ready_hears_from_every_worker():
+    # a slow initializer per worker, the first one up must not answer for the others
+    pool = AnalysisPool(initializer=time.sleep, initargs=(0.5,), workers=3, timeout=30)
+    try:
+        pids = asyncio.run(pool.wait_ready())
+        assert len(pids) == 3
+    finally:
+        pool.shutdown()
+
+
+def test_recycled_executor_starts_its_workers():
+    pool = AnalysisPool(workers=1, timeout=10, max_tasks_per_worker=1)
+
+    async def scenario():
+        # the first task hits max_tasks_per_worker, the pool swaps in a new executor
+        await pool.run(os.getpid)
+        executor = pool._executor
+        deadline = time.monotonic() + 10
+        while not getattr(executor, '_processes', None) and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        return executor
+
+    try:
+        executor = asyncio.run(scenario())
+        assert pool.stats()['recycles'] == 1
+        assert len(executor._processes) == 1
+    finally:
+        pool.shutdown()
+
+
+def test_each_worker_runs_on_every_worker():
+    pool = AnalysisPool(workers=2, timeout=30)
+    try:
+        results = asyncio.run(pool.each_worker(os.getpid))
+        assert len(results) == 2
+        assert all(pid == result for pid, result in results.items())
+    finally:
+        pool.shutdown()
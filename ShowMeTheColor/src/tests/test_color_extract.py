@@ -0,0 +1,58 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from personal_color_analysis import kmeans
+from personal_color_analysis.color_extract import batch_dominant_colors
+
+
+def region(seed, n):
+    # skin-like colors around a random center, (n, 3) uint8 BGR
+    rng = np.random.default_rng(seed)
+    center = rng.integers(60, 200, 3)
+    return np.clip(center + rng.normal(0, 25, (n, 3)), 0, 255).astype(np.uint8)
+
+
+@pytest.mark.parametrize('mode', ['auto', 'full', 'histogram'])
+@pytest.mark.parametrize('sizes', [(300, 500), (6000, 9000), (300, 9000)])
+def test_region_result_does_not_depend_on_the_batch(mode, sizes):
+    a, b = region(1, sizes[0]), region(2, sizes[1])
+    together = batch_dominant_colors([a, b], 4, mode=mode)
+    alone = batch_dominant_colors([b], 4, mode=mode)
+    np.testing.assert_array_equal(np.array(together[1][0]), np.array(alone[0][0]))
+    np.testing.assert_array_equal(together[1][1], alone[0][1])
+
+
+def test_same_input_same_result():
+    regions = [region(seed, 4000) for seed in range(6)]
+    first = batch_dominant_colors(regions, 4)
+    second = batch_dominant_colors(regions, 4)
+    for (colors, hist), (colors2, hist2) in zip(first, second):
+        np.testing.assert_array_equal(np.array(colors), np.array(colors2))
+        np.testing.assert_array_equal(hist, hist2)
+
+
+@pytest.mark.parametrize('bin_size', [1, 2, 3, 4, 8, 16, 32])
+def test_histogram_bins_are_at_most_bin_size(bin_size):
+    bits = kmeans.bits_for_bin_size(bin_size)
+    assert 2 ** (8 - bits) <= bin_size
+    # every pixel is within one bin side of the mean color it is clustered as
+    pixels = region(3, 20000)
+    means, _, bins = kmeans.color_histogram(pixels, bits)
+    assert np.abs(means[bins] - pixels).max() < 2 ** (8 - bits)
+
+
+def test_histogram_mode_matches_full_for_separated_clusters():
+    # clusters further apart than a bin: no bin straddles two clusters, the centers agree.
+    # This is not a bound in general (see benchmarks/dominant_colors.py)
+    rng = np.random.default_rng(4)
+    centers = np.array([[40, 60, 200], [200, 80, 50], [120, 220, 120]])
+    pixels = np.concatenate([np.clip(c + rng.integers(-6, 7, (3000, 3)), 0, 255) for c in centers])
+    pixels = pixels.astype(np.uint8)
+    full, = batch_dominant_colors([pixels], 3, mode='full')
+    hist, = batch_dominant_colors([pixels], 3, mode='histogram', bin_size=kmeans.HIST_BIN_SIZE)
+    np.testing.assert_allclose(np.sort(np.array(full[0]), axis=0), np.sort(np.array(hist[0]), axis=0), atol=0.5)
+    np.testing.assert_array_equal(np.sort(full[1]), np.sort(hist[1]))
@@ -0,0 +1,199 @@
+import asyncio
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import result_cache
+from result_cache import MISS, ResultCache, SingleFlight
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, 'time', clock)
+    return clock
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResultCache(max_entries=2, disk_dir=None)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    # a hit makes 'a' the most recently used, so 'b' goes
+    assert cache.get('a') == 1
+    cache.set('c', 3)
+    assert cache.get('b') is MISS
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_entry_expires_after_ttl(clock):
+    cache = ResultCache(max_entries=10, ttl=60, disk_dir=None)
+    cache.set('a', 1)
+    clock.now += 59
+    assert cache.get('a') == 1
+    clock.now += 1
+    assert cache.get('a') is MISS
+    stats = cache.stats()
+    assert stats['expired'] == 1
+    assert stats['entries'] == 0
+
+
+def test_disabled_cache_keeps_nothing():
+    cache = ResultCache(max_entries=0, disk_dir=None)
+    cache.set('a', 1)
+    assert cache.get('a') is MISS
+
+
+def test_disk_tier_survives_a_new_cache(tmp_path):
+    value = {'result': {'season': 'spring', 'debug': {'lab_b': [1.5, 2.5]}}}
+    ResultCache(max_entries=10, disk_dir=str(tmp_path)).set('a', value)
+    # a restarted process (or another one on the host) finds it on disk
+    cache = ResultCache(max_entries=10, disk_dir=str(tmp_path))
+    assert cache.get('a') == value
+    assert cache.stats()['disk_hits'] == 1
+    # and keeps it in memory from then on
+    assert cache.get('a') == value
+    assert cache.stats()['hits'] == 1
+
+
+def test_expired_disk_entry_is_removed(tmp_path, clock):
+    ResultCache(max_entries=10, ttl=60, disk_dir=str(tmp_path)).set('a', 1)
+    clock.now += 60
+    cache = ResultCache(max_entries=10, ttl=60, disk_dir=str(tmp_path))
+    assert cache.get('a') is MISS
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_disk_tier_is_pruned_to_its_size(tmp_path, monkeypatch):
+    monkeypatch.setattr(result_cache, 'DISK_PRUNE_EVERY', 5)
+    cache = ResultCache(max_entries=10, disk_dir=str(tmp_path), disk_entries=3)
+    for i in range(5):
+        cache.set(str(i), i)
+    assert len(os.listdir(str(tmp_path))) == 3
+
+
+def test_content_key_depends_on_bytes_and_version():
+    assert result_cache.content_key(b'a', '1') == result_cache.content_key(b'a', '1')
+    assert result_cache.content_key(b'a', '1') != result_cache.content_key(b'b', '1')
+    assert result_cache.content_key(b'a', '1') != result_cache.content_key(b'a', '2')
+
+
+def jpeg():
+    ok, data = cv2.imencode('.jpg', np.full((32, 32, 3), 128, dtype=np.uint8))
+    return data.tobytes()
+
+
+def test_etag_answers_304_for_a_cached_result(monkeypatch):
+    import api
+    contents = jpeg()
+    engine = api.engines.get_engine(api.DEFAULT_ENGINE)
+    monkeypatch.setattr(api, 'cache', ResultCache(max_entries=10, disk_dir=None))
+    # a cached result, so nothing is analysed (no worker pool, no models)
+    key = result_cache.content_key(contents, '{}-{}'.format(engine.name, engine.version))
+    api.cache.set(key, {'result': {'season': 'spring'}})
+
+    client = TestClient(api.app)
+    files = {'file': ('a.jpg', contents, 'image/jpeg')}
+    response = client.post('/analyze', files=files)
+    assert response.status_code == 200
+    assert response.headers['X-Cache'] == 'HIT'
+    etag = response.headers['ETag']
+
+    response = client.post('/analyze', files=files, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    # the debug body is a different representation with its own ETag
+    response = client.post('/analyze?debug=true', files=files, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+class Analysis:
+    """Call that blocks until released, counting how often it ran"""
+
+    def __init__(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self.calls = 0
+        self.release = asyncio.Event()
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+def test_concurrent_calls_share_one_run():
+    async def scenario():
+        flight, analysis = SingleFlight(), Analysis(result={'season': 'spring'})
+        calls = [asyncio.ensure_future(flight.do('key', analysis)) for _ in range(3)]
+        await asyncio.sleep(0)
+        analysis.release.set()
+        return flight, analysis, await asyncio.gather(*calls)
+
+    flight, analysis, results = asyncio.run(scenario())
+    assert analysis.calls == 1
+    assert results == [({'season': 'spring'}, False), ({'season': 'spring'}, True), ({'season': 'spring'}, True)]
+    stats = flight.stats()
+    assert (stats['leaders'], stats['coalesced'], stats['in_flight']) == (1, 2, 0)
+
+
+def test_followers_get_the_exception_of_the_run():
+    async def scenario():
+        flight, analysis = SingleFlight(), Analysis(error=ValueError('no face'))
+        calls = [asyncio.ensure_future(flight.do('key', analysis)) for _ in range(3)]
+        await asyncio.sleep(0)
+        analysis.release.set()
+        return analysis, await asyncio.gather(*calls, return_exceptions=True)
+
+    analysis, results = asyncio.run(scenario())
+    assert analysis.calls == 1
+    assert all(isinstance(result, ValueError) for result in results)
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    async def scenario():
+        flight, analysis = SingleFlight(), Analysis(result='result')
+        leader = asyncio.ensure_future(flight.do('key', analysis))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do('key', analysis))
+        await asyncio.sleep(0)
+        # the client of the first request goes away
+        leader.cancel()
+        await asyncio.sleep(0)
+        analysis.release.set()
+        return leader, await follower, analysis
+
+    leader, result, analysis = asyncio.run(scenario())
+    assert leader.cancelled()
+    assert result == ('result', True)
+    assert analysis.calls == 1
+
+
+def test_finished_call_is_not_reused():
+    async def scenario():
+        flight, analysis = SingleFlight(), Analysis(result='result')
+        analysis.release.set()
+        first = await flight.do('key', analysis)
+        second = await flight.do('key', analysis)
+        return first, second, analysis
+
+    first, second, analysis = asyncio.run(scenario())
+    assert first == second == ('result', False)
+    assert analysis.calls == 2
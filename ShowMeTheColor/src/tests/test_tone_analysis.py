@@ -0,0 +1,93 @@
+import os
+import sys
+
+import numpy as np
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from personal_color_analysis import tone_analysis
+
+# decision tree of the original is_warm / is_spr / is_smr, one person at a time
+WARM_B_STD = [11.6518, 11.71445, 3.6484]
+COOL_B_STD = [4.64255, 4.86635, 0.18735]
+SPR_S_STD = [18.59296, 30.30303, 25.80645]
+AUT_S_STD = [27.13987, 39.75155, 37.5]
+SMR_S_STD = [12.5, 21.7195, 24.77064]
+WNT_S_STD = [16.73913, 24.8276, 31.3726]
+
+
+def distances(x, a_std, b_std, a):
+    a_dist = 0
+    b_dist = 0
+    for i in range(3):
+        a_dist += abs(x[i] - a_std[i]) * a[i]
+        b_dist += abs(x[i] - b_std[i]) * a[i]
+    return a_dist, b_dist
+
+
+def legacy_season(lab_b, hsv_s, lab_weight=(30, 20, 5), hsv_weight=(10, 1, 1)):
+    warm_dist, cool_dist = distances(lab_b, WARM_B_STD, COOL_B_STD, lab_weight)
+    if warm_dist <= cool_dist:
+        spr_dist, aut_dist = distances(hsv_s, SPR_S_STD, AUT_S_STD, hsv_weight)
+        return 'spring' if spr_dist <= aut_dist else 'autumn'
+    a = list(hsv_weight)
+    a[1] = 0.5  # eyebrow 영향력 적기 때문에 가중치 줄임
+    smr_dist, wnt_dist = distances(hsv_s, SMR_S_STD, WNT_S_STD, a)
+    return 'summer' if smr_dist <= wnt_dist else 'winter'
+
+
+def features(n, seed=0):
+    # spread around and between the standards, so every season and boundary is hit
+    rng = np.random.default_rng(seed)
+    lab_b = rng.uniform(-2, 18, (n, 3))
+    hsv_s = rng.uniform(5, 45, (n, 3))
+    return lab_b, hsv_s
+
+
+def test_classify_matches_the_legacy_decision_tree():
+    lab_b, hsv_s = features(5000)
+    season, _, _ = tone_analysis.classify(lab_b, hsv_s)
+    expected = [legacy_season(b, s) for b, s in zip(lab_b, hsv_s)]
+    assert list(season) == expected
+    assert set(expected) == {'spring', 'autumn', 'summer', 'winter'}
+
+
+def test_eyebrow_weight_of_summer_winter_is_half():
+    lab_b, hsv_s = features(5000, seed=1)
+    season, _, _ = tone_analysis.classify(lab_b, hsv_s)
+    cool = ~np.isin(season, ['spring', 'autumn'])
+    # rows where a full eyebrow weight would flip summer / winter
+    flipped = 0
+    for s, got in zip(hsv_s[cool], season[cool]):
+        smr_dist, wnt_dist = distances(s, SMR_S_STD, WNT_S_STD, [10, 1, 1])
+        full_weight = 'summer' if smr_dist <= wnt_dist else 'winter'
+        flipped += full_weight != got
+        assert got == legacy_season([0, 0, 0], s)
+    assert flipped > 0
+
+
+def test_ties_go_to_warm_spring_and_summer():
+    # zero weights: every distance is 0, a tie on warm / cool and spring / autumn
+    lab_b, hsv_s = features(3, seed=2)
+    zero = [0, 0, 0]
+    season, warm_margin, season_margin = tone_analysis.classify(lab_b, hsv_s, zero, zero)
+    assert list(season) == ['spring'] * 3
+    assert list(season) == [legacy_season(b, s, zero, zero) for b, s in zip(lab_b, hsv_s)]
+    assert (warm_margin == 0).all() and (season_margin == 0).all()
+
+    # the midpoint of summer and winter is an exact tie with the default weights
+    # (eyebrow 0.5), which goes to summer
+    smr_tie = [(x + y) / 2 for x, y in zip(SMR_S_STD, WNT_S_STD)]
+    assert np.equal(*distances(smr_tie, SMR_S_STD, WNT_S_STD, [10, 0.5, 1]))
+    season, _, season_margin = tone_analysis.classify([zero], [smr_tie])
+    assert season[0] == legacy_season(zero, smr_tie) == 'summer'
+    assert season_margin[0] == 0
+
+
+def test_classify_does_not_change_the_weights():
+    # the legacy is_smr overwrote the eyebrow weight of the caller's list
+    hsv_weight = [10, 1, 1]
+    lab_b, hsv_s = features(10)
+    tone_analysis.classify(lab_b, hsv_s, hsv_weight=hsv_weight)
+    assert hsv_weight == [10, 1, 1]
+    assert tone_analysis.is_smr(hsv_s[0], hsv_weight) in (0, 1)
+    assert hsv_weight == [10, 1, 1]
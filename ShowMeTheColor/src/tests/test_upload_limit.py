@@ -0,0 +1,69 @@
+import asyncio
+import io
+import os
+import sys
+
+import pytest
+from fastapi import HTTPException
+from starlette.applications import Starlette
+from starlette.datastructures import UploadFile
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import upload_limit
+
+
+def limited_app(rejected, max_bytes=1000):
+    async def upload(request):
+        body = await request.body()
+        return JSONResponse({'size': len(body)})
+
+    app = Starlette(routes=[Route('/upload', upload, methods=['POST'])])
+    app.add_middleware(upload_limit.BodyLimitMiddleware, max_bytes=max_bytes,
+                       on_reject=lambda path, status: rejected.append((path, status)))
+    return app
+
+
+def chunks(n, size=100):
+    for _ in range(n):
+        yield b'x' * size
+
+
+def test_body_under_the_limit_passes():
+    rejected = []
+    with TestClient(limited_app(rejected)) as client:
+        response = client.post('/upload', content=b'x' * 1000)
+        assert response.json() == {'size': 1000}
+    assert rejected == []
+
+
+def test_content_length_over_the_limit_is_rejected_and_reported():
+    rejected = []
+    with TestClient(limited_app(rejected)) as client:
+        assert client.post('/upload', content=b'x' * 1001).status_code == 413
+    assert rejected == [('/upload', 413)]
+
+
+def test_streamed_body_over_the_limit_is_rejected_and_reported():
+    # no Content-Length: counted as the chunks arrive
+    rejected = []
+    with TestClient(limited_app(rejected)) as client:
+        assert client.post('/upload', content=chunks(20)).status_code == 413
+    assert rejected == [('/upload', 413)]
+
+
+@pytest.mark.parametrize('declared', [True, False])
+def test_oversized_file_is_413_like_the_body_limit(declared):
+    # declared: the size is known from the multipart part, otherwise counted while reading
+    data = b'x' * 1001
+    file = UploadFile(io.BytesIO(data), size=len(data) if declared else None)
+    with pytest.raises(HTTPException) as e:
+        asyncio.run(upload_limit.read_upload(file, max_bytes=1000))
+    assert e.value.status_code == 413
+
+
+def test_read_upload_returns_the_file():
+    file = UploadFile(io.BytesIO(b'x' * 1000), size=1000)
+    assert asyncio.run(upload_limit.read_upload(file, max_bytes=1000)) == b'x' * 1000
@@ -0,0 +1,132 @@
+"""
+Upload size enforcement that never buffers more than the limit.
+
+BodyLimitMiddleware rejects a request whose Content-Length is over the
+limit before any of the body is read, and counts the bytes of bodies
+without (or with a lying) Content-Length as they arrive, aborting with 413
+as soon as the budget is spent. read_upload() then reads the spooled
+upload in chunks into one bytearray with a per-file budget; the decoder
+takes that buffer as is (np.frombuffer / BytesIO), without another copy.
+check_image() rejects uploads whose declared dimensions are over the pixel
+budget (image_decode.MAX_SOURCE_PIXELS) from the header alone, so a small
+file that would decode to gigabytes never reaches the decoder, and anything
+that is not a JPEG or PNG header (formats whose size is not checked).
+
+Environment:
+    MAX_UPLOAD_BYTES  largest accepted image file (default 10MB)
+"""
+import os
+
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+
+from personal_color_analysis import image_decode
+
+MAX_UPLOAD_BYTES = int(os.environ.get('MAX_UPLOAD_BYTES', 10 * 1024 * 1024))
+# room for the multipart boundaries and part headers around the file
+MULTIPART_OVERHEAD = 64 * 1024
+CHUNK_SIZE = 1024 * 1024
+
+TOO_LARGE = "File size must be less than {:g}MB".format(round(MAX_UPLOAD_BYTES / (1024 * 1024), 1))
+
+
+class BodyLimitMiddleware:
+    """
+    ASGI middleware limiting the request body size.
+    max_bytes: default limit, path_limits: {path: limit} for routes that take more
+    on_reject: called with (path, status) once for every request over its limit
+    """
+
+    def __init__(self, app, max_bytes=MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD, path_limits=None,
+                 on_reject=None):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_limits = path_limits or {}
+        self.on_reject = on_reject
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+        limit = self.path_limits.get(scope['path'], self.max_bytes)
+
+        content_length = None
+        for name, value in scope.get('headers', []):
+            if name == b'content-length':
+                try:
+                    content_length = int(value)
+                except ValueError:
+                    pass
+                break
+        if content_length is not None and content_length > limit:
+            await self._reject(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=TOO_LARGE)
+            return message
+
+        started = False
+
+        async def tracking_send(message):
+            nonlocal started
+            if message['type'] == 'http.response.start':
+                started = True
+                if received > limit and self.on_reject is not None:
+                    # the 413 of limited_receive, rendered by the app's exception handler
+                    self.on_reject(scope['path'], message['status'])
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, tracking_send)
+        except HTTPException as e:
+            # raised from limited_receive outside of a route's exception handling
+            if e.status_code != 413 or started:
+                raise
+            await self._reject(scope, receive, send)
+
+    async def _reject(self, scope, receive, send):
+        if self.on_reject is not None:
+            self.on_reject(scope['path'], 413)
+        response = JSONResponse({'detail': TOO_LARGE}, status_code=413, headers={'Connection': 'close'})
+        await response(scope, receive, send)
+
+
+async def read_upload(file, max_bytes=MAX_UPLOAD_BYTES):
+    """
+    Read an UploadFile into a bytearray, stopping as soon as it is over
+    max_bytes. Raises HTTPException(413) for oversized files, like
+    BodyLimitMiddleware does for the whole body.
+    """
+    size = getattr(file, 'size', None)
+    if size is not None and size > max_bytes:
+        raise HTTPException(status_code=413, detail=TOO_LARGE)
+    buffer = bytearray()
+    while True:
+        chunk = await file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        if len(buffer) + len(chunk) > max_bytes:
+            raise HTTPException(status_code=413, detail=TOO_LARGE)
+        buffer += chunk
+    return buffer
+
+
+def check_image(contents):
+    """
+    413 when the image header declares more than image_decode.MAX_SOURCE_PIXELS
+    pixels, 400 when it is not a JPEG or PNG header
+    """
+    try:
+        image_decode.check_size(contents)
+    except image_decode.ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except image_decode.UnsupportedImage as e:
+        raise HTTPException(status_code=400, detail=str(e))